@@ -1,6 +1,6 @@
 """Instagram Scraper Package."""
 
 __version__ = "0.1.0"
-__all__ = ["config", "scrapers", "models", "utils", "api"]
+__all__ = ["config", "scrapers", "models", "utils", "storage", "api"]
 
-from . import config, scrapers, models, utils, api
\ No newline at end of file
+from . import config, scrapers, models, utils, storage, api
\ No newline at end of file
@@ -1,62 +1,344 @@
 """FastAPI routes."""
 
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
-import csv
-import io
+import asyncio
+import hashlib
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, List, Tuple
 import json
 from urllib.parse import quote, urlparse
 import os
-import yt_dlp
-from datetime import datetime
 import shutil
-from httpx import Timeout
-import glob
 from ..scrapers.profile import ProfileScraper
-from ..scrapers.posts import PostsScraper
+from ..scrapers.posts import PostsScraper, UserNotFoundError
 from ..scrapers.media import MediaScraper
 from ..config.settings import settings
 from ..models.profile import ProfileModel
 from ..models.post import PostModel
-from ..models.media import MediaModel
+from ..models.media import MediaModel, MediaBatchRequest
+from ..utils.http_pool import client_pool
+from ..utils.proxies import proxy_pool
+from ..utils.ratelimit import upstream_limiter
+from ..utils.circuit import media_breakers
+from ..utils.parser import extract_shortcode
+from ..utils.session_cache import session_cache
+from ..utils.cache import media_cache
+from ..utils.singleflight import SingleFlight
+from ..utils.workers import PoolFullError, download_pool
+from ..utils.jobs import Job, download_jobs, download_progress
+from ..utils.variants import POLICIES, VariantPolicy, apply_policy, download_key, policy_from
+from ..utils.thumbnails import (
+    THUMBNAIL_FORMATS, extract_first_frame, ffmpeg_available, pillow_available, render_thumbnail, run_in_pool
+)
+from ..storage.thumbnails import thumbnail_store
+from ..utils.zipstream import cdn_source, file_source, ytdlp_source, zip_stream
+from ..utils.export import EXPORT_FORMATS, arrow_available, arrow_chunks, csv_chunks, gzip_chunks
+from ..utils.downloader import extension_for, is_direct_url, stream_download, ytdlp_download
+from ..storage.downloads import download_store
+from ..storage.sync_state import sync_store
+from ..storage.user_ids import user_id_cache
+from ..storage.posts import SORT_COLUMNS, persisting, post_store
+from ..scrapers.media import media_flight, resolution_stats
 
 router = APIRouter()
 
+VARIANT_PATTERN = f"^({'|'.join(POLICIES)})$"
+VARIANT_DESCRIPTION = "Video variant policy (default from settings)"
+MAX_MB_DESCRIPTION = "Size limit for variant=under_size"
+
+download_flight = SingleFlight()
+global_download_slots = asyncio.Semaphore(settings.download_global_concurrency)
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints exist only when ADMIN_TOKEN is set, and require it."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.get("/admin/proxies", dependencies=[Depends(_require_admin)])
+async def get_proxy_pool():
+    """Health, quarantine and rate-limit state of every configured proxy."""
+    return {"proxies": proxy_pool.snapshot()}
+
+@router.get("/stats")
+async def get_stats():
+    """Runtime counters for the shared caches and pools."""
+    return {
+        "http_pool": client_pool.stats(),
+        "session_cache": session_cache.stats(),
+        "upstream_limiter": upstream_limiter.stats(),
+        "circuit_breakers": media_breakers.snapshot(),
+        "media_resolution": resolution_stats(),
+        "media_cache": media_cache.stats(),
+        "download_pool": download_pool.stats(),
+        "download_store": download_store.stats(),
+        "download_jobs": download_jobs.stats(),
+        "thumbnails": thumbnail_store.stats(),
+        "sync": sync_store.stats(),
+        "user_id_cache": user_id_cache.stats(),
+        "post_store": post_store.stats() if post_store is not None else None,
+        "singleflight": {
+            "media": media_flight.stats(),
+            "downloads": download_flight.stats(),
+        },
+    }
+
 @router.get("/profile/{username}", response_model=ProfileModel)
 async def scrape_profile(username: str):
     async with ProfileScraper() as scraper:
         try:
             profile = await scraper.scrape(username)
+            if post_store is not None:
+                await asyncio.to_thread(post_store.upsert_profile, profile)
             return profile
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+async def _user_id_for(username: str) -> str:
+    """Cached numeric id; on a miss one profile scrape fills the cache."""
+    user_id = user_id_cache.get(username)
+    if user_id:
+        return user_id
+    try:
+        async with ProfileScraper() as profile_scraper:
+            profile = await profile_scraper.scrape(username)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not resolve user id for {username}: {e}")
+    if not profile.id:
+        raise HTTPException(status_code=502, detail=f"Profile response for {username} has no user id")
+    return profile.id
+
+async def _forget_stale_user_id(username: str, scraper: PostsScraper):
+    """Drop a cached id that paged as unknown or empty; the username may have moved."""
+    if scraper.user_missing:
+        print(f"DEBUG: Timeline for {username} is missing or empty, dropping cached user id")
+        await asyncio.to_thread(user_id_cache.invalidate, username)
+
 @router.get("/posts/{username}", response_model=List[PostModel])
 async def scrape_posts(
+    request: Request,
     username: str,
-    max_posts: int = Query(default=50, le=200)
+    max_posts: int = Query(default=50, le=200),
+    stream: Optional[str] = Query(default=None, pattern="^(ndjson|sse)$")
 ):
-    async with ProfileScraper() as profile_scraper:
-        profile = await profile_scraper.scrape(username)
-        user_id = profile.dict().get('id', '1067259270')
-    
-    async with PostsScraper(user_id) as scraper:
-        posts = await scraper.scrape(max_posts)
-        return posts
+    """
+    With stream=ndjson or stream=sse each post is sent as soon as its page
+    is parsed instead of after the whole pagination.
+    """
+    user_id = await _user_id_for(username)
+    if stream is None:
+        async with PostsScraper(user_id) as scraper:
+            try:
+                return [post async for post in persisting(post_store, username, scraper.iter_posts(max_posts))]
+            except UserNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            finally:
+                await _forget_stale_user_id(username, scraper)
+
+    encode = _ndjson if stream == "ndjson" else _sse
+    media_type = "application/x-ndjson" if stream == "ndjson" else "text/event-stream"
+
+    async def events():
+        count = 0
+        async with PostsScraper(user_id) as scraper:
+            posts = persisting(post_store, username, scraper.iter_posts(max_posts))
+            try:
+                async for post in posts:
+                    if await request.is_disconnected():
+                        print(f"DEBUG: Client left, stopping pagination for {username}")
+                        break
+                    count += 1
+                    yield encode(post.model_dump(), "post")
+            except Exception as e:
+                yield encode({"error": str(e)}, "error")
+                return
+            finally:
+                # Closing the generator cancels the pending page request/sleep.
+                await posts.aclose()
+                await _forget_stale_user_id(username, scraper)
+        yield encode({"count": count}, "end")
+
+    return StreamingResponse(
+        events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/sync/{username}")
+async def sync_posts(
+    username: str,
+    backfill: bool = False,
+    max_pages: int = Query(default=settings.sync_max_pages, ge=1, le=50)
+):
+    """
+    Fetch only posts newer than the last sync (stopping at the saved
+    high-water mark), or with backfill=true continue into older posts from
+    the saved cursor. State is saved only when the run succeeds.
+    """
+    state = sync_store.get(username)
+    user_id = await _user_id_for(username)
+    if state.user_id and state.user_id != user_id:
+        # The username now belongs to another account; its marks are meaningless.
+        print(f"DEBUG: {username} moved from user id {state.user_id} to {user_id}, resetting sync state")
+        sync_store.reset(username)
+        state = sync_store.get(username)
+    state.user_id = user_id
+    mode = "backfill" if backfill and state.newest_mark is not None else "incremental"
+    async with PostsScraper(state.user_id) as scraper:
+        try:
+            posts = await scraper.sync(state, max_pages, backfill)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Sync failed: {e}")
+        finally:
+            await _forget_stale_user_id(username, scraper)
+        pages = scraper.pages
+    if post_store is not None:
+        await asyncio.to_thread(post_store.upsert_posts, username, posts)
+    sync_store.save(state)
+    return {
+        "username": username,
+        "mode": mode,
+        "pages": pages,
+        "new_posts": len(posts),
+        "posts": [post.model_dump() for post in posts],
+        "state": state.to_dict(),
+    }
+
+@router.get("/sync/{username}")
+async def get_sync_state(username: str):
+    return sync_store.get(username).to_dict()
+
+@router.delete("/sync/{username}")
+async def reset_sync_state(username: str):
+    sync_store.reset(username)
+    return {"username": username, "reset": True}
+
+def _require_post_store():
+    if post_store is None:
+        raise HTTPException(status_code=404, detail="Post store is disabled (set POST_STORE_ENABLED=true)")
+    return post_store
+
+@router.get("/store/posts")
+async def query_stored_posts(
+    username: Optional[str] = None,
+    since: Optional[int] = Query(default=None, description="Unix time, inclusive"),
+    until: Optional[int] = Query(default=None, description="Unix time, exclusive"),
+    media_type: Optional[str] = None,
+    is_video: Optional[bool] = None,
+    min_likes: Optional[int] = None,
+    sort: str = Query(default="timestamp", pattern=f"^({'|'.join(SORT_COLUMNS)})$"),
+    order: str = Query(default="desc", pattern="^(asc|desc)$"),
+    limit: int = Query(default=50, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0)
+):
+    """Filter and sort previously scraped posts, e.g. top posts by likes in a date range."""
+    store = _require_post_store()
+    posts = store.query_posts(
+        username=username, since=since, until=until, media_type=media_type,
+        is_video=is_video, min_likes=min_likes, sort=sort,
+        descending=order == "desc", limit=limit, offset=offset
+    )
+    return {"count": len(posts), "posts": posts}
+
+@router.get("/store/profiles/{username}")
+async def get_stored_profile(username: str):
+    profile = _require_post_store().get_profile(username)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No stored profile for {username}")
+    return profile
+
+def _variant_policy(variant: Optional[str], max_mb: Optional[float]) -> VariantPolicy:
+    try:
+        return policy_from(variant, max_mb)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/media/{shortcode}", response_model=MediaModel)
-async def scrape_media(shortcode: str):
+async def scrape_media(
+    shortcode: str,
+    variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description=VARIANT_DESCRIPTION),
+    max_mb: Optional[float] = Query(None, gt=0, description=MAX_MB_DESCRIPTION)
+):
+    policy = _variant_policy(variant, max_mb)
     async with MediaScraper() as scraper:
         try:
-            media = await scraper.scrape(shortcode)
+            media = await scraper.scrape(shortcode, policy)
             return media
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/media/batch")
+async def scrape_media_batch(
+    batch: MediaBatchRequest,
+    variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description=VARIANT_DESCRIPTION),
+    max_mb: Optional[float] = Query(None, gt=0, description=MAX_MB_DESCRIPTION)
+):
+    """
+    Resolve many shortcodes/URLs at once, streamed back as NDJSON (one
+    JSON object per line) in completion order. Cached results come first;
+    the rest resolve concurrently under the global upstream limits.
+    """
+    if len(batch.items) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_items} items per batch")
+    policy = _variant_policy(variant, max_mb)
+
+    async def results():
+        pending = []
+        for item in batch.items:
+            try:
+                shortcode = extract_shortcode(item)
+            except ValueError as e:
+                yield _ndjson({"input": item, "ok": False, "error": str(e)})
+                continue
+            if not shortcode:
+                yield _ndjson({"input": item, "ok": False, "error": "No shortcode extracted"})
+                continue
+            cached = media_cache.get(shortcode)
+            if cached is not None:
+                media = apply_policy(cached, policy)
+                yield _ndjson({"input": item, "ok": True, "cached": True, "media": media.model_dump()})
+            else:
+                pending.append((item, shortcode))
+        if not pending:
+            return
+
+        slots = asyncio.Semaphore(settings.batch_concurrency)
+
+        async def resolve(item: str, shortcode: str) -> dict:
+            # One scraper per item: scrapers keep per-request state (proxy,
+            # last_response) on self. Clients and sessions are pooled anyway.
+            async with slots:
+                try:
+                    async with MediaScraper() as scraper:
+                        # Already missed the cache above; don't count a second miss.
+                        media = await scraper.scrape(shortcode, policy, check_cache=False)
+                except Exception as e:
+                    return {"input": item, "ok": False, "shortcode": shortcode, "error": str(e)}
+            return {"input": item, "ok": True, "cached": False, "media": media.model_dump()}
+
+        tasks = [asyncio.create_task(resolve(item, shortcode)) for item, shortcode in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield _ndjson(await next_done)
+        finally:
+            # Client went away: stop resolving what is left.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _ndjson(record: dict, event: str = None) -> str:
+    return json.dumps(record) + "\n"
+
+def _sse(record: dict, event: str) -> str:
+    return f"event: {event}\ndata: {json.dumps(record)}\n\n"
+
 @router.get("/preview/{shortcode}")
 async def preview_media(shortcode: str):
     async with MediaScraper() as scraper:
-        scraper.client.timeout = Timeout(10.0)
         media = await scraper.scrape(shortcode)
     
     if not media.media_urls:
@@ -64,206 +346,471 @@ async def preview_media(shortcode: str):
     
     thumbnails = []
     thumb_base = media.thumbnail_url or media.media_urls[0]
+    derivatives = pillow_available()
     for i, url in enumerate(media.media_urls):
         ext = url.split('.')[-1].lower()
         is_video = media.is_video or 'mp4' in ext or 'mov' in ext
+        source_url = _item_thumbnail_source(media, i + 1) or thumb_base
         thumbnails.append({
             "index": i+1,
-            "url": thumb_base,
+            "url": f"/api/v1/thumbnails/{shortcode}/{i+1}" if derivatives else source_url,
+            "source_url": source_url,
             "type": "video" if is_video else "image",
-            "download_url": f"/downloads/{shortcode}_{i+1:03d}.{ext if is_video else 'jpg'}"
+            "download_url": f"/downloads/{shortcode}/{shortcode}_{i+1:03d}.{'mp4' if is_video else 'jpg'}"
         })
     
     return {"shortcode": shortcode, "thumbnails": thumbnails, "is_multi": len(thumbnails) > 1}
 
-def cleanup_old_downloads(max_dirs: int = 20, max_age_days: int = 7):
-    """
-    Clean up old download directories to prevent disk space issues.
-    Keeps the most recent N directories and deletes anything older than max_age_days.
-    
-    Args:
-        max_dirs: Maximum number of directories to keep (default: 20)
-        max_age_days: Maximum age in days before deletion (default: 7)
-    """
-    downloads_root = "data/outputs/downloads"
-    if not os.path.exists(downloads_root):
-        return
-    
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".m4v")
+
+def _item_thumbnail_source(media: MediaModel, index: int) -> str:
+    """Cover/display image of item `index` (1-based), if the scraper found one."""
+    if index <= len(media.thumbnail_urls):
+        return media.thumbnail_urls[index - 1]
+    return ""
+
+async def _thumbnail_source_bytes(url: str) -> bytes:
+    """Image bytes to resize: the image itself, or a video's first frame."""
+    if not urlparse(url).path.lower().endswith(VIDEO_EXTENSIONS):
+        async with client_pool.get_client(None).stream("GET", url) as resp:
+            if resp.is_error:
+                raise HTTPException(status_code=502, detail=f"Thumbnail source answered {resp.status_code}")
+            if not resp.headers.get("content-type", "").startswith("video/"):
+                return await resp.aread()
+    if not ffmpeg_available():
+        raise HTTPException(status_code=404, detail="Video has no cover image and ffmpeg is not installed")
     try:
-        dirs_with_time = []
-        for dir_name in os.listdir(downloads_root):
-            dir_path = os.path.join(downloads_root, dir_name)
-            if os.path.isdir(dir_path):
-                try:
-                    mtime = os.path.getmtime(dir_path)
-                    dirs_with_time.append((dir_name, mtime, dir_path))
-                except OSError:
-                    continue
-        
-        if not dirs_with_time:
-            return
-        
-        dirs_with_time.sort(key=lambda x: x[1], reverse=True)
-        
-        current_time = datetime.now().timestamp()
-        max_age_seconds = max_age_days * 24 * 60 * 60
-        
-        deleted_count = 0
-        for i, (dir_name, mtime, dir_path) in enumerate(dirs_with_time):
-            age_seconds = current_time - mtime
-            should_delete = False
-            
-            if i >= max_dirs:
-                should_delete = True
-            
-            if age_seconds > max_age_seconds:
-                should_delete = True
-            
-            if should_delete:
-                try:
-                    shutil.rmtree(dir_path)
-                    deleted_count += 1
-                except OSError as e:
-                    print(f"Warning: Could not delete {dir_path}: {e}")
-        
-        if deleted_count > 0:
-            print(f"Cleanup: Deleted {deleted_count} old download directory(ies)")
-    
+        return await run_in_pool(extract_first_frame, url, settings.thumbnail_frame_timeout)
     except Exception as e:
-        print(f"Warning: Error during cleanup: {e}")
+        raise HTTPException(status_code=502, detail=f"Could not extract video frame: {e}")
+
+@router.get("/thumbnails/{shortcode}/{index}")
+async def get_thumbnail(
+    request: Request,
+    shortcode: str,
+    index: int = Path(ge=1),
+    size: int = Query(default=settings.thumbnail_size, ge=32, le=1080),
+    format: str = Query(default="webp", pattern="^(webp|jpeg)$")
+):
+    """
+    Small WebP/JPEG thumbnail of one post item (first frame for videos
+    without a cover). Rendered once in a process pool, then served from
+    the derivative cache with ETag and long-lived Cache-Control headers.
+    """
+    sha256 = await asyncio.to_thread(thumbnail_store.source_hash, shortcode, index)
+    path = thumbnail_store.get(sha256, size, format) if sha256 else None
+    if path is None:
+        async with MediaScraper() as scraper:
+            media = await scraper.scrape(shortcode)
+        if index > len(media.media_urls):
+            raise HTTPException(status_code=404, detail=f"Post has {len(media.media_urls)} item(s)")
+        source_url = _item_thumbnail_source(media, index) or media.media_urls[index - 1]
+        if not pillow_available():
+            return RedirectResponse(source_url, status_code=307)
 
-def find_existing_files(shortcode: str, expected_count: int) -> Optional[List[dict]]:
+        source = await _thumbnail_source_bytes(source_url)
+        sha256 = hashlib.sha256(source).hexdigest()
+        await asyncio.to_thread(thumbnail_store.remember_source, shortcode, index, sha256)
+        path = thumbnail_store.get(sha256, size, format)
+        if path is None:
+            try:
+                data = await run_in_pool(render_thumbnail, source, size, format)
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=f"Could not render thumbnail: {e}")
+            path = await asyncio.to_thread(thumbnail_store.put, sha256, size, format, data)
+
+    etag = f'"{sha256[:32]}-{size}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.thumbnail_max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=THUMBNAIL_FORMATS[format], headers=headers)
+
+async def _download_item(
+    index: int,
+    url: str,
+    shortcode: str,
+    output_dir: str,
+    post_slots: asyncio.Semaphore,
+    job: Optional[Job] = None
+) -> Tuple[str, Optional[str]]:
     """
-    Search for existing downloaded files for a given shortcode.
-    Returns list of file info dicts if all files found, None otherwise.
+    Download one item into output_dir; returns (path, sha256 if known).
+    Byte progress is reported to job when one is given.
     """
-    downloads_root = "data/outputs/downloads"
-    if not os.path.exists(downloads_root):
-        return None
+    stem = f"{shortcode}_{index:03d}"
+    progress = thread_progress = None
+    if job is not None:
+        loop = asyncio.get_running_loop()
+        progress = lambda downloaded, total: job.progress(index, downloaded, total)
+        thread_progress = lambda downloaded, total: loop.call_soon_threadsafe(progress, downloaded, total)
+    async with post_slots, global_download_slots:
+        try:
+            sha256 = None
+            if is_direct_url(url):
+                result = await stream_download(url, os.path.join(output_dir, stem), progress=progress)
+                full_path, sha256 = result.path, result.sha256
+            else:
+                full_path = await download_pool.run(ytdlp_download, url, output_dir, stem, thread_progress)
+        except PoolFullError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Download failed for URL {index}: {str(e)}")
     
-    found_files = []
-    found_timestamp = None
+    if full_path.lower().endswith('.jpeg'):
+        new_path = os.path.join(output_dir, f"{stem}.jpg")
+        os.replace(full_path, new_path)
+        full_path = new_path
+    if job is not None:
+        size = os.path.getsize(full_path)
+        job.progress(index, size, size, done=True)
+    return full_path, sha256
+
+async def _download_post(shortcode: str, media: MediaModel, key: Optional[str] = None) -> dict:
+    """
+    Download every media URL of a post, reusing earlier downloads when found.
+    Runs at most once at a time per key via download_flight. The key (see
+    download_key) names the post in the download store; it defaults to the
+    shortcode. Byte progress goes to the key's shared progress record, which
+    mirrors it into every job waiting on this download.
+    """
+    key = key or shortcode
+    progress = download_progress.acquire(key)
+    try:
+        return await _download_post_files(shortcode, media, key, progress)
+    finally:
+        download_progress.release(progress)
+
+async def _download_post_files(shortcode: str, media: MediaModel, key: str, job: Job) -> dict:
+    existing_files = download_store.lookup(key, len(media.media_urls))
+    job.set_items(len(media.media_urls))
+    if existing_files:
+        for index in range(1, len(existing_files) + 1):
+            job.progress(index, 0, None, done=True)
+        return {
+            "shortcode": shortcode,
+            "files": existing_files,
+            "dir": None,
+            "preview_thumbnail": media.thumbnail_url,
+            "cached": True
+        }
     
-    for timestamp_dir in os.listdir(downloads_root):
-        timestamp_path = os.path.join(downloads_root, timestamp_dir)
-        if not os.path.isdir(timestamp_path):
-            continue
-        
-        all_found = True
-        temp_files = []
-        
-        for i in range(1, expected_count + 1):
-            pattern = os.path.join(timestamp_path, f"{shortcode}_{i:03d}.*")
-            matched = glob.glob(pattern)
-            if matched:
-                full_path = matched[0]
-                filename = os.path.basename(full_path)
-                ext = os.path.splitext(filename)[1].lstrip('.').lower()
-                temp_files.append({
-                    "name": filename,
-                    "path": f"/downloads/{timestamp_dir}/{filename}",
-                    "type": ext
-                })
-            else:
-                all_found = False
-                break
-        
-        if all_found and len(temp_files) == expected_count:
-            found_files = temp_files
-            found_timestamp = timestamp_dir
-            break
+    staging_dir = download_store.staging_dir(key)
+    try:
+        post_slots = asyncio.Semaphore(settings.download_post_concurrency)
+        tasks = [
+            asyncio.create_task(_download_item(i + 1, url, shortcode, staging_dir, post_slots, job))
+            for i, url in enumerate(media.media_urls)
+        ]
+        try:
+            staged = await asyncio.gather(*tasks)
+        except BaseException:
+            # One item failed (or we were cancelled): stop the others before
+            # their staging dir is removed. yt-dlp calls still queued in
+            # download_pool are dropped; one already running finishes in its thread.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        files = await asyncio.to_thread(download_store.commit, key, list(staged))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
     
-    if found_files and len(found_files) == expected_count:
-        return found_files
-    return None
+    return {
+        "shortcode": shortcode,
+        "files": files,
+        "dir": download_store.post_dir(key),
+        "preview_thumbnail": media.thumbnail_url,
+        "cached": False
+    }
 
 @router.get("/download")
-async def download_media(url: Optional[str] = Query(None, description="Full IG URL (e.g., https://www.instagram.com/p/C_abc123/ or /reel/DQ6KvymjeLO/) or use path param"), shortcode: Optional[str] = Query(None, description="Direct shortcode")):
+async def download_media(
+    url: Optional[str] = Query(None, description="Full IG URL (e.g., https://www.instagram.com/p/C_abc123/ or /reel/DQ6KvymjeLO/) or use path param"),
+    shortcode: Optional[str] = Query(None, description="Direct shortcode"),
+    run_async: bool = Query(False, alias="async", description="Queue a job and return its id immediately"),
+    variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description=VARIANT_DESCRIPTION),
+    max_mb: Optional[float] = Query(None, gt=0, description=MAX_MB_DESCRIPTION)
+):
     if not url and not shortcode:
         raise HTTPException(status_code=400, detail="Provide 'url' or 'shortcode' param")
     
     if url:
-        parsed = urlparse(url)
-        path = parsed.path
-        if '/p/' in path:
-            shortcode = path.split('/p/')[1].split('/')[0]
-        elif '/reel/' in path:
-            shortcode = path.split('/reel/')[1].split('/')[0]
-        else:
-            raise HTTPException(status_code=400, detail="Invalid IG URL; must contain /p/ or /reel/ for shortcode")
+        try:
+            shortcode = extract_shortcode(url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     if not shortcode:
         raise HTTPException(status_code=400, detail="No shortcode extracted")
+
+    policy = _variant_policy(variant, max_mb)
+    if run_async:
+        job = download_jobs.submit(
+            download_key(shortcode, policy),
+            lambda job: _run_download_job(shortcode, job, policy),
+            shortcode=shortcode,
+            policy=policy.tag
+        )
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/v1/jobs/{job.id}",
+            "events_url": f"/api/v1/jobs/{job.id}/events",
+        })
     
     async with MediaScraper() as scraper:
-        media = await scraper.scrape(shortcode)
+        media = await scraper.scrape(shortcode, policy)
     
     if not media.media_urls:
         raise HTTPException(status_code=404, detail="No media URLs found for shortcode")
     
-    existing_files = find_existing_files(shortcode, len(media.media_urls))
-    if existing_files:
-        return {
-            "shortcode": shortcode,
-            "files": existing_files,
-            "dir": None,
-            "preview_thumbnail": media.thumbnail_url,
-            "cached": True
-        }
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_dir = f"data/outputs/downloads/{timestamp}"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    files = []
-    ydl_opts = {
-        'outtmpl': f'{output_dir}/{shortcode}_%(autonumber)03d.%(ext)s',
-        'quiet': True,
-        'no_warnings': True,
-        'format': 'best',
+    key = download_key(shortcode, policy, media)
+    return await download_flight.do(key, lambda: _download_post(shortcode, media, key=key))
+
+@router.get("/download/{shortcode}.zip")
+async def download_zip(
+    shortcode: str,
+    variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description=VARIANT_DESCRIPTION),
+    max_mb: Optional[float] = Query(None, gt=0, description=MAX_MB_DESCRIPTION)
+):
+    """
+    All items of a post as one ZIP (stored, no recompression), streamed
+    while the items download in parallel. Items already in the download
+    store are read from disk.
+    """
+    policy = _variant_policy(variant, max_mb)
+    async with MediaScraper() as scraper:
+        media = await scraper.scrape(shortcode, policy)
+    if not media.media_urls:
+        raise HTTPException(status_code=404, detail="No media URLs found for shortcode")
+
+    key = download_key(shortcode, policy, media)
+    stored = download_store.lookup(key, len(media.media_urls))
+    items = []
+    for i, url in enumerate(media.media_urls):
+        stem = f"{shortcode}_{i + 1:03d}"
+        if stored:
+            source = file_source(os.path.join(download_store.post_dir(key), stored[i]["name"]))
+        elif is_direct_url(url):
+            source = cdn_source(url)
+        else:
+            source = ytdlp_source(url, stem)
+        items.append((stem, source))
+
+    async def archive():
+        try:
+            async for data in zip_stream(
+                items,
+                settings.download_post_concurrency,
+                settings.zip_buffer_chunks,
+                None if stored else global_download_slots
+            ):
+                if data:
+                    yield data
+        except Exception as e:
+            # Headers are gone already; aborting leaves the client a truncated file.
+            print(f"DEBUG: ZIP stream for {shortcode} failed: {e}")
+            raise
+
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{shortcode}.zip"'}
+    )
+
+async def _run_download_job(shortcode: str, job: Job, policy: VariantPolicy) -> dict:
+    async with MediaScraper() as scraper:
+        media = await scraper.scrape(shortcode, policy)
+    if not media.media_urls:
+        raise ValueError("No media URLs found for shortcode")
+    key = download_key(shortcode, policy, media)
+    # Watch the key before joining the flight, so a job coalesced onto a
+    # download started by another request still sees its per-file progress.
+    progress = download_progress.acquire(key)
+    progress.watch(job)
+    try:
+        return await download_flight.do(key, lambda: _download_post(shortcode, media, key))
+    finally:
+        progress.unwatch(job)
+        download_progress.release(progress)
+
+def _get_job(job_id: str) -> Job:
+    job = download_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, per-file byte progress and, once done, the /download result."""
+    return _get_job(job_id).snapshot()
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events: `progress` updates, then one `done` or `failed`."""
+    job = _get_job(job_id)
+
+    async def events():
+        async for snapshot in job.events():
+            if await request.is_disconnected():
+                break
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+            elif snapshot["status"] in ("done", "failed"):
+                yield _sse(snapshot, snapshot["status"])
+            else:
+                yield _sse(snapshot, "progress")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+PASSTHROUGH_HEADERS = ("content-type", "content-length", "content-range", "accept-ranges", "etag", "last-modified")
+
+@router.get("/stream/{shortcode}")
+async def stream_media(
+    request: Request,
+    shortcode: str,
+    index: int = Query(default=1, ge=1, description="1-based item index within the post"),
+    variant: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description=VARIANT_DESCRIPTION),
+    max_mb: Optional[float] = Query(None, gt=0, description=MAX_MB_DESCRIPTION)
+):
+    """
+    Pipe one media item from the CDN to the client chunk by chunk, without
+    staging it on disk. Range requests are forwarded, so video players can
+    seek. Items already in the download store are served from there. With
+    stream_tee on, a full download of a single-item post is also written
+    to the download store.
+    """
+    policy = _variant_policy(variant, max_mb)
+    async with MediaScraper() as scraper:
+        media = await scraper.scrape(shortcode, policy)
+    if index > len(media.media_urls):
+        raise HTTPException(status_code=404, detail=f"Post has {len(media.media_urls)} item(s)")
+
+    key = download_key(shortcode, policy, media)
+    stored = download_store.lookup(key, len(media.media_urls))
+    if stored:
+        name = stored[index - 1]["name"]
+        return FileResponse(os.path.join(download_store.post_dir(key), name), filename=name,
+                            content_disposition_type="inline")
+
+    url = media.media_urls[index - 1]
+    if not is_direct_url(url):
+        raise HTTPException(status_code=422, detail="Item is not a direct CDN link; use /download")
+
+    headers = {"Accept-Encoding": "identity"}
+    if "range" in request.headers:
+        headers["Range"] = request.headers["range"]
+    # Hold a global download slot until the upstream response is closed,
+    # whichever of the body or the background task gets there first.
+    await global_download_slots.acquire()
+    slot_held = True
+
+    async def close_upstream():
+        nonlocal slot_held
+        await upstream.aclose()
+        if slot_held:
+            slot_held = False
+            global_download_slots.release()
+
+    client = client_pool.get_client(None)
+    try:
+        upstream = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+    except BaseException:
+        global_download_slots.release()
+        raise
+    if upstream.status_code >= 400 and upstream.status_code != 416:
+        await close_upstream()
+        # Most likely an expired CDN signature; resolve afresh next time.
+        media_cache.invalidate(shortcode)
+        raise HTTPException(status_code=502, detail=f"CDN answered {upstream.status_code}")
+
+    content_type = upstream.headers.get("content-type", "application/octet-stream")
+    name = f"{shortcode}_{index:03d}.{extension_for(content_type, url)}"
+    tee_enabled = settings.stream_tee and upstream.status_code == 200 and len(media.media_urls) == 1
+
+    async def body():
+        # The staging dir is made here, not before the response: if the client
+        # goes away before the body starts, there is nothing left to clean up.
+        tee_dir = download_store.staging_dir(key) if tee_enabled else None
+        tee = None
+        digest = hashlib.sha256()
+        complete = False
+        try:
+            if tee_dir:
+                tee = open(os.path.join(tee_dir, name), "wb")
+            # One chunk in flight: the next upstream read waits for the client.
+            async for chunk in upstream.aiter_bytes(settings.download_chunk_size):
+                if tee is not None:
+                    tee.write(chunk)
+                    digest.update(chunk)
+                yield chunk
+            complete = True
+        finally:
+            await close_upstream()
+            if tee is not None:
+                tee.close()
+                if complete:
+                    await asyncio.to_thread(
+                        download_store.commit, key, [(os.path.join(tee_dir, name), digest.hexdigest())]
+                    )
+            if tee_dir:
+                shutil.rmtree(tee_dir, ignore_errors=True)
+
+    response_headers = {
+        header: upstream.headers[header] for header in PASSTHROUGH_HEADERS if header in upstream.headers
     }
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for i, url in enumerate(media.media_urls):
+    response_headers["Content-Disposition"] = f'inline; filename="{name}"'
+    return StreamingResponse(
+        body(),
+        status_code=upstream.status_code,
+        headers=response_headers,
+        media_type=content_type,
+        background=BackgroundTask(close_upstream)
+    )
+
+@router.get("/posts/{username}/export")
+async def export_posts(
+    request: Request,
+    username: str,
+    max_posts: int = Query(default=50, le=200),
+    format: str = Query(default="csv", pattern="^(csv|arrow|parquet)$")
+):
+    """
+    Stream posts as a CSV, Arrow IPC or Parquet attachment, written as pages
+    arrive. CSV/Arrow are gzip-encoded when the client accepts it.
+    """
+    if format != "csv" and not arrow_available():
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+    user_id = await _user_id_for(username)
+    media_type, extension = EXPORT_FORMATS[format]
+
+    async def posts():
+        async with PostsScraper(user_id) as scraper:
+            pages = persisting(post_store, username, scraper.iter_posts(max_posts))
             try:
-                ydl.download([url])
-                info = ydl.extract_info(url, download=False)
-                pattern = os.path.join(output_dir, f"{shortcode}_{i+1:03d}.*")
-                matched = glob.glob(pattern)
-                if matched:
-                    full_path = matched[0]
-                    filename = os.path.basename(full_path)
-                    ext = os.path.splitext(filename)[1].lstrip('.').lower()
-                else:
-                    ext = info.get('ext') or 'file'
-                    if ext in ('jpeg',):
-                        ext = 'jpg'
-                    filename = f"{shortcode}_{i+1:03d}.{ext}"
-                    full_path = os.path.join(output_dir, filename)
-
-                files.append({
-                    "name": filename,
-                    "path": f"/downloads/{timestamp}/{filename}",
-                    "type": ext
-                })
+                async for post in pages:
+                    yield post
             except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Download failed for URL {i+1}: {str(e)}")
-    
-    cleanup_old_downloads()
-    
-    return {
-        "shortcode": shortcode,
-        "files": files,
-        "dir": output_dir,
-        "preview_thumbnail": media.thumbnail_url,
-        "cached": False
-    }
+                # Abort the response so the client sees a truncated transfer.
+                print(f"DEBUG: Export of {username} failed mid-stream: {e}")
+                raise
+            finally:
+                await pages.aclose()
+                await _forget_stale_user_id(username, scraper)
 
-@router.get("/posts/{username}/export")
-async def export_posts_csv(username: str, max_posts: int = 50):
-    posts = await scrape_posts(username, max_posts)
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=PostModel.model_fields.keys())
-    writer.writeheader()
-    writer.writerows([post.dict() for post in posts])
-    return {"csv": output.getvalue(), "download": f"data:text/csv;charset=utf-8,{output.getvalue()}"}
+    if format == "csv":
+        body = csv_chunks(posts())
+    else:
+        body = arrow_chunks(posts(), format, settings.max_posts_per_request)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{username}_posts.{extension}"',
+        "Vary": "Accept-Encoding",
+    }
+    if format != "parquet" and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
@@ -33,6 +33,100 @@ class ScraperSettings(BaseSettings):
     max_posts_per_request: int = 12
     ig_app_id: str = "936619743392459"
 
+    proxy_rate_per_second: float = 1.0
+    proxy_burst: int = 5
+    proxy_quarantine_seconds: int = 300
+    proxy_block_threshold: int = 3
+    proxy_block_window: int = 120
+
+    # /admin/* endpoints are disabled (404) unless a token is set
+    admin_token: str = ""
+
+    limiter_max_concurrency: int = 16
+    limiter_min_concurrency: int = 1
+    limiter_max_rate: float = 5.0
+    limiter_min_rate: float = 0.2
+    limiter_decrease_factor: float = 0.5
+    limiter_increase_step: float = 1.0
+    limiter_rate_increase: float = 0.05
+    limiter_recovery_seconds: int = 30
+    limiter_backoff_seconds: int = 5
+    limiter_state_path: str = ""
+
+    http_timeout: float = 10.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    session_cache_ttl: int = 3600
+    session_refresh_margin: int = 300
+
+    media_cache_backend: str = "memory"
+    media_cache_path: str = "data/cache/media.db"
+    media_cache_max_entries: int = 1024
+    media_cache_max_ttl: int = 3600
+    media_cache_default_ttl: int = 600
+    media_cache_expiry_margin: int = 120
+
+    breaker_failure_threshold: int = 3
+    breaker_reset_seconds: int = 300
+
+    media_hedging: bool = False
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 10
+    hedge_default_delay: float = 2.0
+    hedge_min_delay: float = 0.5
+    hedge_max_delay: float = 8.0
+
+    batch_max_items: int = 500
+    batch_concurrency: int = 8
+
+    download_workers: int = 4
+    download_queue_limit: int = 16
+    download_post_concurrency: int = 4
+    download_global_concurrency: int = 8
+    download_chunk_size: int = 65536
+    downloads_dir: str = "data/outputs/downloads"
+    downloads_staging_dir: str = "data/outputs/staging"
+    downloads_index_path: str = "data/outputs/downloads.db"
+    downloads_blobs_dir: str = "data/outputs/blobs"
+    download_cache_high_watermark: int = 1024 * 1024 * 1024
+    download_cache_low_watermark: int = 768 * 1024 * 1024
+    download_eviction_interval: int = 60
+    download_orphan_max_age: int = 24 * 60 * 60
+    download_legacy_max_age: int = 7 * 24 * 60 * 60
+    download_fsync: str = "end"
+    stream_tee: bool = False
+    zip_buffer_chunks: int = 16
+
+    thumbnails_dir: str = "data/cache/thumbnails"
+    thumbnails_index_path: str = "data/cache/thumbnails.db"
+    thumbnail_size: int = 320
+    thumbnail_workers: int = 2
+    thumbnail_max_age: int = 7 * 24 * 60 * 60
+    thumbnail_cache_max_age: int = 30 * 24 * 60 * 60
+    thumbnail_frame_timeout: float = 30.0
+
+    # Video variant selection ("max_resolution", "max_bitrate", "under_size", "all")
+    variant_policy: str = "max_resolution"
+    variant_max_mb: float = 8.0
+
+    sync_state_path: str = "data/cache/sync.db"
+    sync_max_pages: int = 5
+
+    post_store_enabled: bool = False
+    post_store_path: str = "data/cache/posts.db"
+    post_store_batch_size: int = 100
+
+    user_id_cache_path: str = "data/cache/user_ids.db"
+    user_id_cache_ttl: int = 30 * 24 * 60 * 60
+
+    job_workers: int = 4
+    job_queue_limit: int = 100
+    job_ttl: int = 3600
+    job_progress_interval: float = 0.25
+
     class Config:
         env_file = ".env"
         extra = "ignore"
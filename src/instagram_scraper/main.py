@@ -1,15 +1,41 @@
 """FastAPI entry point for Social Media Scraper."""
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from .api.routes import router
+from .config.settings import settings
+from .utils.http_pool import client_pool
+from .utils.proxies import proxy_pool
+from .utils.workers import PoolFullError, download_pool
+from .utils.jobs import download_jobs
+from .utils import thumbnails
+from .storage.downloads import download_store, run_eviction
+from .storage.thumbnails import run_pruning, thumbnail_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client_pool.start(proxy_pool.proxies)
+    eviction_task = asyncio.create_task(run_eviction(download_store))
+    pruning_task = asyncio.create_task(run_pruning(thumbnail_store))
+    yield
+    eviction_task.cancel()
+    pruning_task.cancel()
+    await download_jobs.aclose()
+    await client_pool.aclose()
+    download_pool.shutdown()
+    thumbnails.shutdown()
 
 
 app = FastAPI(
     title="Mbuvi Tech IG Downloader API",
     description="Scrape and download public IG data without login.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -20,9 +46,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PoolFullError)
+async def pool_full_handler(request: Request, exc: PoolFullError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
 app.include_router(router, prefix="/api/v1")
 
-app.mount("/downloads", StaticFiles(directory="data/outputs/downloads"), name="downloads")
+app.mount("/downloads", StaticFiles(directory=settings.downloads_dir), name="downloads")
 
 app.mount("/", StaticFiles(directory="web", html=True), name="static")
 
@@ -1,4 +1,4 @@
 """Data models."""
 from .profile import ProfileModel
 from .post import PostModel
-from .media import MediaModel
\ No newline at end of file
+from .media import MediaModel, MediaBatchRequest, MediaVariant
\ No newline at end of file
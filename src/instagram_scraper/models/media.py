@@ -1,10 +1,23 @@
 """Media data model."""
 
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
+class MediaVariant(BaseModel):
+    """One encoding of a video item; size is in bytes, bitrate in kbit/s."""
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bitrate: Optional[float] = None
+    size: Optional[int] = None
+
 class MediaModel(BaseModel):
     shortcode: str
     media_urls: List[str]
     thumbnail_url: str = ""
-    is_video: bool = False
\ No newline at end of file
+    thumbnail_urls: List[str] = []
+    is_video: bool = False
+    variants: List[List[MediaVariant]] = []
+
+class MediaBatchRequest(BaseModel):
+    items: List[str]
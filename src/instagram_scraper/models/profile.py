@@ -5,6 +5,7 @@ from pydantic import BaseModel
 
 class ProfileModel(BaseModel):
     username: str
+    id: Optional[str] = None
     full_name: str
     biography: str
     followers: int
@@ -2,41 +2,46 @@
 
 import asyncio
 import random
+import time
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 import httpx
 from fake_useragent import UserAgent
 from ..config.settings import settings
-from ..utils.proxies import get_proxy
+from ..utils.proxies import proxy_pool, redact_proxy
 from ..utils.headers import get_headers
+from ..utils.http_pool import client_pool
+from ..utils.ratelimit import upstream_limiter
 
 ua = UserAgent()
 
 class BaseScraper(ABC):
     def __init__(self):
         self.client: Optional[httpx.AsyncClient] = None
+        self.proxy: Optional[str] = None
+        self.last_response: Optional[httpx.Response] = None
         self.session_headers: Dict[str, str] = {}
 
     async def __aenter__(self):
-        proxy = get_proxy(settings.proxies_list)
+        proxy = proxy_pool.choose()
         
         if proxy:
-            print(f"DEBUG: Using proxy: {proxy}")
+            print(f"DEBUG: Using proxy: {redact_proxy(proxy)}")
         else:
             print(f"DEBUG: No proxy configured (proxies_list has {len(settings.proxies_list)} items)")
         
-
-        self.client = httpx.AsyncClient(
-            timeout=10.0,
-            headers=get_headers(ua),
-            proxy=proxy
-        )
-        self.session_headers = self.client.headers.copy()
+        # Clients are shared through the pool, so per-scraper headers are
+        # kept here and sent with each request instead of mutating the client.
+        self.proxy = proxy
+        self.client = client_pool.get_client(proxy)
+        self.session_headers = get_headers(ua)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client:
-            await self.client.aclose()
+        # The pooled client outlives the scraper and is closed at app shutdown.
+        # The reference is kept so shared in-flight work started by this
+        # scraper can finish after its caller has left the context.
+        pass
 
     async def _make_request(
         self,
@@ -45,33 +50,50 @@ class BaseScraper(ABC):
         params: Optional[Dict[str, Any]] = None,
         json: Optional[Dict[str, Any]] = None,
         data: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
         **kwargs
     ) -> httpx.Response:
+        limited = upstream_limiter.applies_to(url)
         for attempt in range(settings.max_retries):
             try:
-                resp = await self.client.request(
-                    method, url, params=params, json=json, data=data, **kwargs
-                )
+                await proxy_pool.acquire(self.proxy)
+                if limited:
+                    # Global AIMD limiter: waits in a fair queue and absorbs
+                    # the backoff after 429s for every caller at once.
+                    await upstream_limiter.acquire()
+                try:
+                    started = time.monotonic()
+                    resp = await self.client.request(
+                        method, url, params=params, json=json, data=data,
+                        headers={**self.session_headers, **(headers or {})}, **kwargs
+                    )
+                finally:
+                    if limited:
+                        upstream_limiter.release()
+                self.last_response = resp
                 if resp.status_code == 429 or resp.status_code == 403:
                     print(f"DEBUG: IG Block - Status {resp.status_code}, Preview: {resp.text[:100]}...")
-                    await asyncio.sleep(2 ** attempt + random.uniform(0, 1))  
-                    if attempt > 0:
-                        self.client.headers.update(get_headers(ua))
-                        # Rotate proxy on retry
-                        proxy = get_proxy(settings.proxies_list)
-                        if proxy:
-                            await self.client.aclose()
-                            print(f"DEBUG: Rotating to new proxy: {proxy}")
-                            self.client = httpx.AsyncClient(
-                                timeout=10.0,
-                                headers=get_headers(ua),
-                                proxy=proxy
-                            )
+                    proxy_pool.record_failure(self.proxy, resp.status_code)
+                    if resp.status_code == 429 and limited:
+                        upstream_limiter.on_throttle()
+                    else:
+                        await asyncio.sleep(2 ** attempt + random.uniform(0, 1))
+                    self.session_headers.update(get_headers(ua))
+                    # Rotate to a healthier proxy by switching to its pooled client
+                    proxy = proxy_pool.choose(exclude=self.proxy)
+                    if proxy and proxy != self.proxy:
+                        print(f"DEBUG: Rotating to new proxy: {redact_proxy(proxy)}")
+                        self.proxy = proxy
+                        self.client = client_pool.get_client(proxy)
                     continue
+                proxy_pool.record_success(self.proxy, time.monotonic() - started)
+                if limited:
+                    upstream_limiter.on_success()
                 resp.raise_for_status()
                 return resp
             except httpx.RequestError as e:
                 print(f"DEBUG: IG Request Error on attempt {attempt + 1}: {e}")
+                proxy_pool.record_failure(self.proxy)
                 if attempt == settings.max_retries - 1:
                     raise
                 await asyncio.sleep(random.uniform(settings.request_delay_min, settings.request_delay_max))
@@ -2,61 +2,301 @@
 
 import asyncio
 import random
+import time
 from urllib.parse import quote
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import yt_dlp
-from ..models.media import MediaModel
+from ..models.media import MediaModel, MediaVariant
 from .base import BaseScraper, ua
 from ..utils.headers import get_headers
+from ..utils.http_pool import client_pool
+from ..utils.session_cache import SessionBootstrap, session_cache
+from ..utils.cache import media_cache
+from ..utils.singleflight import SingleFlight
+from ..utils.workers import PoolFullError, download_pool
+from ..utils.ratelimit import upstream_limiter
+from ..utils.circuit import media_breakers
+from ..utils.latency import LatencyTracker
+from ..utils.variants import VariantPolicy, apply_policy, choose, estimate_size, policy_from
+from ..config.settings import settings
 import httpx
 
 DOC_ID_POST = "8845758582119845"
+BOOTSTRAP_USERNAME = "nasa"
+
+media_flight = SingleFlight()
+strategy_latency = {"graphql": LatencyTracker(), "ytdlp": LatencyTracker()}
+hedge_stats = {"hedged": 0, "graphql_wins": 0, "ytdlp_wins": 0}
+
+
+def hedge_delay() -> float:
+    """
+    How long to wait for GraphQL before also starting yt-dlp: the observed
+    GraphQL latency percentile, clamped to the configured bounds.
+    """
+    tracker = strategy_latency["graphql"]
+    if len(tracker) < settings.hedge_min_samples:
+        delay = settings.hedge_default_delay
+    else:
+        delay = tracker.percentile(settings.hedge_percentile)
+    return min(max(delay, settings.hedge_min_delay), settings.hedge_max_delay)
+
+
+def resolution_stats() -> dict:
+    return {
+        "latency": {name: tracker.stats() for name, tracker in strategy_latency.items()},
+        "hedging": {"enabled": settings.media_hedging, "delay_seconds": round(hedge_delay(), 3), **hedge_stats},
+    }
+
+
+BLOCK_STATUSES = (401, 403, 429)
+BLOCK_MARKERS = (
+    "302", "redirect", "login", "rate-limit", "rate limit", "max retries exceeded",
+    "http error 401", "http error 403", "http error 429", "timed out", "urlopen error",
+)
+
+
+def _is_block(error: Exception) -> bool:
+    """
+    True when a strategy failed because it is blocked (login redirect,
+    401/403/429, transport errors) rather than because of the post itself
+    (deleted or private shortcode, no media). Only blocks feed the breakers.
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in BLOCK_STATUSES or 300 <= status < 400
+    message = str(error).lower()
+    return any(marker in message for marker in BLOCK_MARKERS)
+
+
+def _is_session_rejected(resp: httpx.Response) -> bool:
+    """True when IG answered with a block or a redirect to the login page."""
+    if resp.status_code in (401, 403):
+        return True
+    if resp.is_redirect:
+        return "login" in resp.headers.get("location", "").lower() or resp.status_code == 302
+    return False
+
+
+async def fetch_session(proxy: str = None) -> SessionBootstrap:
+    """Load a public profile page to obtain csrftoken and session cookies."""
+    client = client_pool.get_client(proxy)
+    async with upstream_limiter.slot():
+        resp = await client.get(
+            f"https://www.instagram.com/{BOOTSTRAP_USERNAME}/",
+            headers=get_headers(ua)
+        )
+    resp.raise_for_status()
+    return SessionBootstrap(
+        csrf_token=resp.cookies.get("csrftoken", "dummy_csrf"),
+        cookies=dict(resp.cookies)
+    )
+
+def _video_item(node: Dict[str, Any]) -> Tuple[str, List[MediaVariant]]:
+    """Default (highest resolution) URL of a GraphQL video node plus its alternatives."""
+    variants = [
+        MediaVariant(url=version["url"], width=version.get("width"), height=version.get("height"))
+        for version in node.get("video_versions") or []
+    ]
+    if node.get("video_url") and all(variant.url != node["video_url"] for variant in variants):
+        dimensions = node.get("dimensions") or {}
+        variants.insert(0, MediaVariant(
+            url=node["video_url"], width=dimensions.get("width"), height=dimensions.get("height")
+        ))
+    default = choose(variants, VariantPolicy())[0].url
+    return default, variants if len(variants) > 1 else []
+
+
+def _ytdlp_variants(info: Dict[str, Any]) -> List[MediaVariant]:
+    """
+    Progressive (video + audio) formats of one yt-dlp item. Video-only DASH
+    streams are skipped since they would download without sound.
+    """
+    variants = []
+    for fmt in info.get("formats") or []:
+        if not fmt.get("url") or fmt.get("vcodec") == "none" or fmt.get("acodec") == "none":
+            continue
+        variants.append(MediaVariant(
+            url=fmt["url"],
+            width=fmt.get("width"),
+            height=fmt.get("height"),
+            bitrate=fmt.get("tbr"),
+            size=fmt.get("filesize") or fmt.get("filesize_approx") or estimate_size(fmt.get("tbr"), info.get("duration")),
+        ))
+    return variants if len(variants) > 1 else []
+
+
+def _ytdlp_extract_info(url: str, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Blocking yt-dlp extraction; the YoutubeDL instance lives in the worker thread."""
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
 
 class MediaScraper(BaseScraper):
-    async def scrape(self, shortcode: str) -> MediaModel:
+    async def scrape(
+        self,
+        shortcode: str,
+        policy: Optional[VariantPolicy] = None,
+        check_cache: bool = True
+    ) -> MediaModel:
+        """
+        Serve from media_cache when the CDN links are still valid,
+        otherwise resolve the shortcode and cache the result. Concurrent
+        misses for the same shortcode share one resolution.
+        The cache keeps every video variant; the variant policy (default
+        from settings) is applied to what is returned. Callers that have
+        just missed the cache themselves pass check_cache=False.
+        """
+        media = media_cache.get(shortcode) if check_cache else None
+        if media is None:
+            media = await media_flight.do(shortcode, lambda: self._resolve_and_cache(shortcode))
+        return apply_policy(media, policy or policy_from(None))
+
+    async def _resolve_and_cache(self, shortcode: str) -> MediaModel:
+        media = await self._resolve(shortcode)
+        media_cache.set(shortcode, media)
+        return media
+
+    async def _resolve(self, shortcode: str) -> MediaModel:
         """
         Try GraphQL first (with proxies if available) for private accounts.
         Fall back to yt-dlp if GraphQL fails (e.g., on cloud IPs).
+        Each strategy has a circuit breaker (GraphQL per proxy), so a
+        strategy that keeps failing is skipped until its cool-down ends.
+        With media_hedging on, yt-dlp is raced against a slow GraphQL call.
+        """
+        graphql_breaker = media_breakers.get("graphql", self.proxy)
+        ytdlp_breaker = media_breakers.get("ytdlp")
+        if graphql_breaker.allow():
+            if settings.media_hedging:
+                return await self._resolve_hedged(shortcode, graphql_breaker, ytdlp_breaker)
+            try:
+                return await self._run_strategy("graphql", graphql_breaker, self._scrape_with_graphql, shortcode)
+            except (httpx.HTTPStatusError, ValueError, Exception) as graphql_error:
+                error_msg = str(graphql_error)
+                if _is_block(graphql_error):
+                    print(f"DEBUG: GraphQL blocked (likely cloud IP): {error_msg}, falling back to yt-dlp")
+                else:
+                    print(f"DEBUG: GraphQL failed: {error_msg}, falling back to yt-dlp")
+        else:
+            error_msg = "circuit open"
+            print("DEBUG: GraphQL circuit open, going straight to yt-dlp")
+
+        return await self._fallback_ytdlp(shortcode, ytdlp_breaker, error_msg)
+
+    async def _run_strategy(self, name: str, breaker, fn, shortcode: str) -> MediaModel:
+        """
+        Run one resolution strategy, feeding its breaker and latency tracker.
+        Failed and cancelled (hedged-out) calls are timed too, so the hedge
+        delay is not estimated from the fast successes alone.
         """
+        started = time.monotonic()
         try:
-            return await self._scrape_with_graphql(shortcode)
-        except (httpx.HTTPStatusError, ValueError, Exception) as graphql_error:
-            error_msg = str(graphql_error)
-            if "302" in error_msg or "Redirect" in error_msg or "login" in error_msg.lower():
-                print(f"DEBUG: GraphQL blocked (likely cloud IP): {error_msg}, falling back to yt-dlp")
+            media = await fn(shortcode)
+        except PoolFullError:
+            raise
+        except asyncio.CancelledError:
+            strategy_latency[name].record(time.monotonic() - started)
+            raise
+        except Exception as e:
+            strategy_latency[name].record(time.monotonic() - started)
+            if _is_block(e):
+                breaker.record_failure()
             else:
-                print(f"DEBUG: GraphQL failed: {error_msg}, falling back to yt-dlp")
+                breaker.record_neutral()
+            raise
+        breaker.record_success()
+        strategy_latency[name].record(time.monotonic() - started)
+        return media
 
-            try:
-                return await self._scrape_with_ytdlp(shortcode)
-            except Exception as ytdlp_error:
-               
-                raise ValueError(
-                    f"Both methods failed. GraphQL: {error_msg}, yt-dlp: {str(ytdlp_error)}"
-                )
+    async def _fallback_ytdlp(self, shortcode: str, breaker, error_msg: str) -> MediaModel:
+        if not breaker.allow():
+            raise ValueError(f"Both methods failed. GraphQL: {error_msg}, yt-dlp: circuit open")
+        try:
+            return await self._run_strategy("ytdlp", breaker, self._scrape_with_ytdlp, shortcode)
+        except PoolFullError:
+            raise
+        except Exception as ytdlp_error:
+            raise ValueError(
+                f"Both methods failed. GraphQL: {error_msg}, yt-dlp: {str(ytdlp_error)}"
+            )
+
+    async def _resolve_hedged(self, shortcode: str, graphql_breaker, ytdlp_breaker) -> MediaModel:
+        """
+        Start GraphQL; if it has not answered within hedge_delay(), start
+        yt-dlp as well. The first valid MediaModel wins and the other task
+        is cancelled.
+        """
+        graphql_task = asyncio.create_task(
+            self._run_strategy("graphql", graphql_breaker, self._scrape_with_graphql, shortcode)
+        )
+        tasks = {graphql_task: "graphql"}
+        try:
+            done, _ = await asyncio.wait({graphql_task}, timeout=hedge_delay())
+            if graphql_task in done:
+                if graphql_task.exception() is None:
+                    return graphql_task.result()
+                print(f"DEBUG: GraphQL failed: {graphql_task.exception()}, falling back to yt-dlp")
+                return await self._fallback_ytdlp(shortcode, ytdlp_breaker, str(graphql_task.exception()))
+            if not ytdlp_breaker.allow():
+                return await graphql_task
+
+            print("DEBUG: GraphQL slower than hedge delay, racing yt-dlp")
+            hedge_stats["hedged"] += 1
+            ytdlp_task = asyncio.create_task(
+                self._run_strategy("ytdlp", ytdlp_breaker, self._scrape_with_ytdlp, shortcode)
+            )
+            tasks[ytdlp_task] = "ytdlp"
+            pending = set(tasks)
+            errors = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedge_stats[f"{tasks[task]}_wins"] += 1
+                        return task.result()
+                    errors[tasks[task]] = task.exception()
+            raise ValueError(
+                f"Both methods failed. GraphQL: {errors.get('graphql')}, yt-dlp: {errors.get('ytdlp')}"
+            )
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
     
     async def _scrape_with_graphql(self, shortcode: str) -> MediaModel:
         """
         Original GraphQL method - works with private accounts.
         Uses proxies automatically via BaseScraper if configured.
+        The csrftoken/cookies come from session_cache rather than a fresh
+        profile page load on every call.
         """
-        temp_username = "nasa"
-        profile_resp = await self._make_request("GET", f"https://www.instagram.com/{temp_username}/")
-        csrf_token = profile_resp.cookies.get("csrftoken", "dummy_csrf")
+        session_key = self.proxy
+        session = await session_cache.get(session_key, lambda: fetch_session(session_key))
         
-        self.client.headers.update(get_headers(ua, csrf_token))
+        self.session_headers.update(get_headers(ua, session.csrf_token))
+        request_headers = {"content-type": "application/x-www-form-urlencoded"}
+        if session.cookies:
+            request_headers["cookie"] = session.cookie_header()
         
         url = "https://www.instagram.com/graphql/query"
         variables = {"shortcode": shortcode}
         body = f"variables={quote(json.dumps(variables))}&doc_id={DOC_ID_POST}"
         
-        resp = await self._make_request(
-            "POST",
-            url,
-            data=body,
-            headers={"content-type": "application/x-www-form-urlencoded"}
-        )
+        try:
+            resp = await self._make_request(
+                "POST",
+                url,
+                data=body,
+                headers=request_headers
+            )
+        except Exception:
+            if self.last_response is not None and _is_session_rejected(self.last_response):
+                session_cache.invalidate(session_key)
+            raise
         
         print(f"DEBUG: IG Media JSON = {resp.json()}")
         
@@ -67,25 +307,33 @@ class MediaScraper(BaseScraper):
             data = response_data["data"]["xdt_shortcode_media"]
         except (json.JSONDecodeError, KeyError) as e:
             raise ValueError(f"Parse Error: {e}. Full Response: {resp.text[:200]}")
+        if not data:
+            raise ValueError(f"Post {shortcode} not found (deleted or private)")
         
         media_urls = []
+        thumbnail_urls = []
+        variants = []
         
-        if data.get("video_url"):
-            media_urls.append(data["video_url"])
-        elif data.get("video_versions"):
-            for version in data["video_versions"]:
-                media_urls.append(version["url"])
+        if data.get("video_url") or data.get("video_versions"):
+            # One video; video_versions are encodings of it, not extra items.
+            url, item_variants = _video_item(data)
+            media_urls.append(url)
+            thumbnail_urls.append(data.get("display_url", ""))
+            variants.append(item_variants)
         elif data.get("edge_sidecar_to_children"):
             for child in data["edge_sidecar_to_children"]["edges"]:
                 child_node = child["node"]
-                if child_node.get("video_url"):
-                    media_urls.append(child_node["video_url"])
-                elif child_node.get("video_versions"):
-                    media_urls.append(child_node["video_versions"][0]["url"])
+                if child_node.get("video_url") or child_node.get("video_versions"):
+                    url, item_variants = _video_item(child_node)
                 else:
-                    media_urls.append(child_node["display_url"])
+                    url, item_variants = child_node["display_url"], []
+                media_urls.append(url)
+                thumbnail_urls.append(child_node.get("display_url", ""))
+                variants.append(item_variants)
         elif data.get("display_url"): 
             media_urls.append(data["display_url"])
+            thumbnail_urls.append(data["display_url"])
+            variants.append([])
         else:
             raise ValueError("No media URLs found in response")
         
@@ -93,7 +341,9 @@ class MediaScraper(BaseScraper):
             shortcode=shortcode,
             media_urls=media_urls,
             thumbnail_url=data.get("thumbnail_src", ""),
-            is_video=bool(data.get("video_versions") or data.get("video_url"))
+            thumbnail_urls=thumbnail_urls,
+            is_video=bool(data.get("video_versions") or data.get("video_url")),
+            variants=variants
         )
     
     async def _scrape_with_ytdlp(self, shortcode: str) -> MediaModel:
@@ -110,48 +360,65 @@ class MediaScraper(BaseScraper):
         }
         
         
-        loop = asyncio.get_event_loop()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(None, ydl.extract_info, post_url, False)
-            
-            media_urls = []
-            thumbnail_url = ""
-            is_video = False
-            
-          
-            if 'url' in info:
-                media_urls.append(info['url'])
-                is_video = info.get('vcodec') != 'none'
-                thumbnail_url = info.get('thumbnail', '')
-            
-            
-            elif 'entries' in info and info['entries']:
-                for entry in info['entries']:
-                    if 'url' in entry:
-                        media_urls.append(entry['url'])
-                        if entry.get('vcodec') != 'none':
-                            is_video = True
-                        if not thumbnail_url:
-                            thumbnail_url = entry.get('thumbnail', '')
-            
-
-            elif 'formats' in info:
-                best_format = None
-                for fmt in info['formats']:
-                    if fmt.get('vcodec') != 'none':
+        await upstream_limiter.acquire()
+        # The limiter slot (and the pool slot) are held until the worker thread
+        # returns, even if this call is cancelled (e.g. as a losing hedge).
+        info = await download_pool.run(
+            _ytdlp_extract_info, post_url, ydl_opts, on_finish=upstream_limiter.release
+        )
+        
+        media_urls = []
+        thumbnail_urls = []
+        variants = []
+        thumbnail_url = ""
+        is_video = False
+        
+      
+        if 'url' in info:
+            media_urls.append(info['url'])
+            is_video = info.get('vcodec') != 'none'
+            thumbnail_url = info.get('thumbnail', '')
+            thumbnail_urls.append(thumbnail_url)
+            variants.append(_ytdlp_variants(info))
+        
+        
+        elif 'entries' in info and info['entries']:
+            for entry in info['entries']:
+                if 'url' in entry:
+                    media_urls.append(entry['url'])
+                    thumbnail_urls.append(entry.get('thumbnail', ''))
+                    variants.append(_ytdlp_variants(entry))
+                    if entry.get('vcodec') != 'none':
                         is_video = True
-                    if not best_format or fmt.get('quality', 0) > best_format.get('quality', 0):
-                        best_format = fmt
-                if best_format and 'url' in best_format:
-                    media_urls.append(best_format['url'])
-                thumbnail_url = info.get('thumbnail', '')
-            
-            if not media_urls:
-                raise ValueError("No media URLs found in yt-dlp response")
-            
-            return MediaModel(
-                shortcode=shortcode,
-                media_urls=media_urls,
-                thumbnail_url=thumbnail_url,
-                is_video=is_video
-            )
\ No newline at end of file
+                    if not thumbnail_url:
+                        thumbnail_url = entry.get('thumbnail', '')
+        
+
+        elif 'formats' in info:
+            best_format = None
+            for fmt in info['formats']:
+                if fmt.get('vcodec') != 'none':
+                    is_video = True
+                if not best_format or fmt.get('quality', 0) > best_format.get('quality', 0):
+                    best_format = fmt
+            thumbnail_url = info.get('thumbnail', '')
+            item_variants = _ytdlp_variants(info)
+            if item_variants:
+                media_urls.append(choose(item_variants, VariantPolicy())[0].url)
+            elif best_format and 'url' in best_format:
+                media_urls.append(best_format['url'])
+            if media_urls:
+                thumbnail_urls.append(thumbnail_url)
+                variants.append(item_variants)
+        
+        if not media_urls:
+            raise ValueError("No media URLs found in yt-dlp response")
+        
+        return MediaModel(
+            shortcode=shortcode,
+            media_urls=media_urls,
+            thumbnail_url=thumbnail_url,
+            thumbnail_urls=thumbnail_urls,
+            is_video=is_video,
+            variants=variants
+        )
\ No newline at end of file
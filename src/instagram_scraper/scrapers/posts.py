@@ -1,22 +1,73 @@
 """Posts scraper with pagination."""
 
+import asyncio
 import json
+import random
 from urllib.parse import quote
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
 from ..models.post import PostModel
-from ..config.settings import settings 
+from ..config.settings import settings
+from ..storage.sync_state import SyncState
 from .base import BaseScraper
 
-DOC_ID_FEED = "9310670392322965" 
+DOC_ID_FEED = "9310670392322965"
+
+
+class UserNotFoundError(ValueError):
+    """The timeline query knows no user with this id."""
+
+
+def parse_post(node: Dict[str, Any]) -> PostModel:
+    return PostModel(
+        shortcode=node["shortcode"],
+        caption=node.get("edge_media_to_caption", {}).get("edges", [{}])[0].get("node", {}).get("text", ""),
+        likes=node["edge_media_preview_like"]["count"],
+        comments=node["edge_media_to_comment"]["count"],
+        timestamp=node["taken_at_timestamp"],
+        is_video=node.get("is_video", False),
+        media_type=node.get("__typename", "GraphImage"),
+        accessibility_caption=node.get("accessibility_caption", "")
+    )
+
+
+def _is_known(node: Dict[str, Any], mark: Tuple[int, str]) -> bool:
+    """True when node is the marked post or older than it."""
+    timestamp, shortcode = mark
+    return node["shortcode"] == shortcode or node["taken_at_timestamp"] < timestamp
+
 
 class PostsScraper(BaseScraper):
     def __init__(self, user_id: str):
         super().__init__()
         self.user_id = user_id
+        self.pages = 0
+        self.end_cursor: Optional[str] = None
+        self.has_next_page = False
+        self.reached_mark = False
+        self.user_missing = False
 
-    async def scrape(self, max_posts: int = 50) -> List[PostModel]:
-        posts = []
-        cursor = None
+    async def iter_posts(
+        self,
+        max_posts: int = 50,
+        cursor: Optional[str] = None,
+        stop_at: Optional[Tuple[int, str]] = None,
+        max_pages: Optional[int] = None
+    ) -> AsyncIterator[PostModel]:
+        """
+        Yield posts as soon as their page is parsed. Closing the generator
+        (e.g. a disconnected client) stops pagination before the next page.
+
+        Paging starts at cursor. With stop_at=(timestamp, shortcode) it ends
+        at the first already-known post (pinned posts are skipped, not
+        treated as the boundary). After each page end_cursor/has_next_page
+        say where a later run can resume.
+
+        user_missing is set when the id is unknown (UserNotFoundError) or
+        the newest page is empty, both signs of a stale username -> id mapping.
+        """
+        count = 0
+        pages = 0
+        self.reached_mark = False
         url = "https://www.instagram.com/graphql/query"
         variables = {
             "id": self.user_id,
@@ -24,40 +75,97 @@ class PostsScraper(BaseScraper):
             "after": cursor
         }
 
-        while len(posts) < max_posts:
+        while count < max_posts:
             variables["after"] = cursor
             body = f"variables={quote(json.dumps(variables))}&doc_id={DOC_ID_FEED}"
-            
+
             resp = await self._make_request(
                 "POST",
                 url,
                 data=body,
                 headers={"content-type": "application/x-www-form-urlencoded"}
             )
-            
-            data = resp.json()["data"]["user"]["edge_owner_to_timeline_media"]
+
+            user = resp.json()["data"]["user"]
+            if user is None:
+                self.user_missing = True
+                raise UserNotFoundError(f"No user with id {self.user_id}")
+            data = user["edge_owner_to_timeline_media"]
             edges = data["edges"]
-            
+            page_info = data["page_info"]
+            if cursor is None and not edges and not page_info["has_next_page"]:
+                self.user_missing = True
+            self.pages += 1
+            pages += 1
+            self.end_cursor = page_info["end_cursor"]
+            self.has_next_page = page_info["has_next_page"]
+
             for edge in edges:
-                if len(posts) >= max_posts:
+                if count >= max_posts:
                     break
                 node = edge["node"]
-                posts.append(PostModel(
-                    shortcode=node["shortcode"],
-                    caption=node.get("edge_media_to_caption", {}).get("edges", [{}])[0].get("node", {}).get("text", ""),
-                    likes=node["edge_media_preview_like"]["count"],
-                    comments=node["edge_media_to_comment"]["count"],
-                    timestamp=node["taken_at_timestamp"],
-                    is_video=node.get("is_video", False),
-                    media_type=node.get("__typename", "GraphImage"),
-                    accessibility_caption=node.get("accessibility_caption", "")
-                ))
-            
-            page_info = data["page_info"]
-            if not page_info["has_next_page"]:
+                if stop_at is not None and _is_known(node, stop_at):
+                    if node.get("pinned_for_users"):
+                        continue
+                    self.reached_mark = True
+                    return
+                count += 1
+                yield parse_post(node)
+
+            if not self.has_next_page or count >= max_posts:
+                break
+            if max_pages is not None and pages >= max_pages:
                 break
-            cursor = page_info["end_cursor"]
+            cursor = self.end_cursor
 
             await asyncio.sleep(random.uniform(settings.request_delay_min, settings.request_delay_max))
 
-        return posts
\ No newline at end of file
+    async def scrape(self, max_posts: int = 50) -> List[PostModel]:
+        return [post async for post in self.iter_posts(max_posts)]
+
+    async def _collect(self, max_pages: int, **kwargs) -> List[PostModel]:
+        limit = max_pages * settings.max_posts_per_request
+        return [post async for post in self.iter_posts(limit, max_pages=max_pages, **kwargs)]
+
+    async def sync(self, state: SyncState, max_pages: int, backfill: bool = False) -> List[PostModel]:
+        """
+        Fetch what is missing for this user within max_pages requests and
+        advance state (not persisted here).
+
+        Incremental: page from the top until the high-water mark, then spend
+        leftover pages closing an earlier gap. Running out of pages before
+        the mark leaves a gap to be closed by the next poll. The first sync
+        sets the mark and the backfill cursor.
+        Backfill: continue into older posts from the saved backfill_cursor.
+        """
+        if backfill and state.newest_mark is not None:
+            if state.backfill_complete:
+                return []
+            posts = await self._collect(max_pages, cursor=state.backfill_cursor)
+            state.backfill_cursor = self.end_cursor if self.has_next_page else None
+            state.backfill_complete = not self.has_next_page
+            return posts
+
+        first_sync = state.newest_mark is None
+        had_gap = state.gap_mark is not None
+        posts = await self._collect(max_pages, stop_at=state.newest_mark)
+
+        if first_sync:
+            state.backfill_cursor = self.end_cursor if self.has_next_page else None
+            state.backfill_complete = not self.has_next_page
+        elif not self.reached_mark and self.has_next_page:
+            # Keep the lowest boundary so an older, unfinished gap is not lost.
+            state.gap_timestamp, state.gap_shortcode = state.gap_mark or state.newest_mark
+            state.gap_cursor = self.end_cursor
+            had_gap = False
+        if posts:
+            newest = max(posts, key=lambda post: post.timestamp)
+            state.newest_timestamp, state.newest_shortcode = newest.timestamp, newest.shortcode
+
+        if had_gap and self.pages < max_pages:
+            posts += await self._collect(max_pages - self.pages, cursor=state.gap_cursor, stop_at=state.gap_mark)
+            if self.reached_mark or not self.has_next_page:
+                state.gap_cursor = state.gap_timestamp = state.gap_shortcode = None
+            else:
+                state.gap_cursor = self.end_cursor
+        return posts
@@ -1,7 +1,9 @@
 """Profile scraper."""
 
+import asyncio
 from typing import Dict, Any
 from ..models.profile import ProfileModel
+from ..storage.user_ids import user_id_cache
 from .base import BaseScraper
 
 class ProfileScraper(BaseScraper):
@@ -11,9 +13,14 @@ class ProfileScraper(BaseScraper):
         data = resp.json()["data"]["user"]
         
         posts_summary = data.get("edge_owner_to_timeline_media", {}).get("count", 0)
+        if data.get("id"):
+            replaced = await asyncio.to_thread(user_id_cache.set, data["username"], data["id"])
+            if replaced:
+                print(f"DEBUG: {data['username']} now has user id {data['id']} (was {replaced})")
         
         return ProfileModel(
             username=data["username"],
+            id=str(data["id"]) if data.get("id") else None,
             full_name=data.get("full_name", ""),
             biography=data.get("biography", ""),
             followers=data["edge_followed_by"]["count"],
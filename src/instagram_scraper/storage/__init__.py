@@ -0,0 +1,6 @@
+"""Local persistence."""
+from .downloads import DownloadStore
+from .sync_state import SyncState, SyncStateStore
+from .posts import PostStore
+from .user_ids import UserIdCache
+from .thumbnails import ThumbnailStore
@@ -0,0 +1,354 @@
+"""Download store: files laid out by shortcode and item index, tracked in SQLite."""
+
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from ..config.settings import settings
+
+# Pre-index layout: one /downloads/<YYYYmmdd_HHMMSS>/ directory per request.
+LEGACY_DIR = re.compile(r"^\d{8}_\d{6}$")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadStore:
+    """
+    Downloaded media lives at <root>/<shortcode>/<shortcode>_<NNN>.<ext>
+    and is served under /downloads/<shortcode>/. An SQLite index maps each
+    shortcode to its files, sizes, content hashes and last access time, so
+    cache lookups are a single indexed query instead of a directory scan.
+
+    Bytes are stored once per content hash under blobs_root; the per-post
+    files are hardlinks to those blobs, and each blob keeps a reference
+    count so it is only deleted when no post uses it any more.
+    """
+
+    def __init__(self, root: str, staging_root: str, index_path: str, blobs_root: str):
+        self.root = root
+        self.staging_root = staging_root
+        self.blobs_root = blobs_root
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(staging_root, exist_ok=True)
+        os.makedirs(blobs_root, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS posts (
+                shortcode TEXT PRIMARY KEY,
+                item_count INTEGER NOT NULL,
+                total_size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                shortcode TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                linked INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (shortcode, idx)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_last_access ON posts (last_access);
+            CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256);
+            """
+        )
+        try:
+            # Indexes created before files.linked existed.
+            self._conn.execute("ALTER TABLE files ADD COLUMN linked INTEGER NOT NULL DEFAULT 1")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.commit()
+        self.eviction_runs = 0
+        self.evicted_posts = 0
+        self.evicted_bytes = 0
+        self.orphans_removed = 0
+        self.last_eviction_at: Optional[float] = None
+        self.last_eviction_seconds = 0.0
+
+    def post_dir(self, shortcode: str) -> str:
+        return os.path.join(self.root, shortcode)
+
+    def staging_dir(self, shortcode: str) -> str:
+        """Fresh private directory to download a post into before commit."""
+        return tempfile.mkdtemp(prefix=f"{shortcode}-", dir=self.staging_root)
+
+    @staticmethod
+    def _file_info(shortcode: str, name: str, ext: str) -> dict:
+        return {
+            "name": name,
+            "path": f"/downloads/{shortcode}/{name}",
+            "type": ext
+        }
+
+    def lookup(self, shortcode: str, expected_count: int) -> Optional[List[dict]]:
+        """
+        Return file info dicts for a fully downloaded post and mark it as
+        accessed, or None if it is not (completely) in the store.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT item_count FROM posts WHERE shortcode = ?", (shortcode,)
+            ).fetchone()
+            if row is None or row[0] != expected_count:
+                return None
+            rows = self._conn.execute(
+                "SELECT name, ext FROM files WHERE shortcode = ? ORDER BY idx", (shortcode,)
+            ).fetchall()
+            post_dir = self.post_dir(shortcode)
+            if len(rows) != expected_count or not all(
+                os.path.exists(os.path.join(post_dir, name)) for name, _ in rows
+            ):
+                self._release(shortcode)
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE posts SET last_access = ? WHERE shortcode = ?", (time.time(), shortcode)
+            )
+            self._conn.commit()
+        return [self._file_info(shortcode, name, ext) for name, ext in rows]
+
+    def _blob_path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.blobs_root, sha256[:2], f"{sha256}.{ext}")
+
+    def _store_blob(self, staged: str, sha256: str, ext: str, size: int) -> str:
+        """Adopt staged as the blob for sha256, or drop it if one exists. Lock held."""
+        row = self._conn.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is not None:
+            if os.path.exists(row[0]):
+                os.remove(staged)
+            else:
+                # Blob file lost: restore it, keeping the other posts' references.
+                os.makedirs(os.path.dirname(row[0]), exist_ok=True)
+                os.replace(staged, row[0])
+            self._conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+            return row[0]
+        blob_path = self._blob_path(sha256, ext)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(staged, blob_path)
+        self._conn.execute(
+            "INSERT INTO blobs (sha256, path, size, refcount) VALUES (?, ?, ?, 1)",
+            (sha256, blob_path, size)
+        )
+        return blob_path
+
+    @staticmethod
+    def _link(blob_path: str, dest: str) -> bool:
+        """Hardlink dest to the blob, copying where links are unsupported; True if linked."""
+        tmp = f"{dest}.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(blob_path, tmp)
+            linked = True
+        except OSError:
+            shutil.copyfile(blob_path, tmp)
+            linked = False
+        os.replace(tmp, dest)
+        return linked
+
+    def commit(self, shortcode: str, staged: List[Tuple[str, Optional[str]]]) -> List[dict]:
+        """
+        Store staged (path, sha256) files, in item order, as the post's
+        items and index them in one transaction. A missing sha256 is computed
+        here. Blocking; call it via asyncio.to_thread.
+        """
+        items = []
+        for idx, (path, sha256) in enumerate(staged, start=1):
+            name = os.path.basename(path)
+            ext = os.path.splitext(name)[1].lstrip(".").lower() or "file"
+            items.append((idx, path, name, ext, os.path.getsize(path), sha256 or file_sha256(path)))
+
+        post_dir = self.post_dir(shortcode)
+        now = time.time()
+        with self._lock:
+            self._release(shortcode, keep_dir=True)
+            os.makedirs(post_dir, exist_ok=True)
+            rows = []
+            for idx, path, name, ext, size, sha256 in items:
+                blob_path = self._store_blob(path, sha256, ext, size)
+                linked = self._link(blob_path, os.path.join(post_dir, name))
+                rows.append((shortcode, idx, name, ext, size, sha256, int(linked)))
+            names = {row[2] for row in rows}
+            for leftover in os.listdir(post_dir):
+                if leftover not in names:
+                    os.remove(os.path.join(post_dir, leftover))
+
+            self._conn.executemany(
+                "INSERT INTO files (shortcode, idx, name, ext, size, sha256, linked) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO posts (shortcode, item_count, total_size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (shortcode, len(rows), sum(r[4] for r in rows), now, now)
+            )
+            self._conn.commit()
+        return [self._file_info(shortcode, name, ext) for _, _, name, ext, _, _, _ in rows]
+
+    def remove(self, shortcode: str) -> int:
+        """Delete a post's files and index rows; returns blob bytes freed."""
+        with self._lock:
+            freed = self._release(shortcode)
+            self._conn.commit()
+        return freed
+
+    def _release(self, shortcode: str, keep_dir: bool = False) -> int:
+        """
+        Drop a post's rows and its references to blobs, deleting blobs that
+        are no longer referenced. Lock held; caller commits.
+        """
+        freed = 0
+        hashes = [row[0] for row in self._conn.execute(
+            "SELECT sha256 FROM files WHERE shortcode = ?", (shortcode,)
+        )]
+        for sha256 in hashes:
+            self._conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (sha256,))
+            row = self._conn.execute(
+                "SELECT path, size FROM blobs WHERE sha256 = ? AND refcount <= 0", (sha256,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                try:
+                    os.remove(row[0])
+                except OSError:
+                    pass
+                freed += row[1]
+        self._conn.execute("DELETE FROM files WHERE shortcode = ?", (shortcode,))
+        self._conn.execute("DELETE FROM posts WHERE shortcode = ?", (shortcode,))
+        if not keep_dir:
+            shutil.rmtree(self.post_dir(shortcode), ignore_errors=True)
+        return freed
+
+    def total_bytes(self) -> int:
+        """Bytes actually on disk, i.e. the sum of unique blobs."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self, high_watermark: int, low_watermark: int) -> int:
+        """
+        If the store holds more than high_watermark bytes, delete least
+        recently accessed posts until it is at or below low_watermark.
+        Returns the number of bytes freed. Blocking.
+        """
+        started = time.monotonic()
+        self.eviction_runs += 1
+        freed = 0
+        total = self.total_bytes()
+        if total > high_watermark:
+            with self._lock:
+                candidates = self._conn.execute(
+                    "SELECT shortcode FROM posts ORDER BY last_access"
+                ).fetchall()
+            for (shortcode,) in candidates:
+                if total - freed <= low_watermark:
+                    break
+                # Shared blobs stay on disk while another post references them.
+                freed += self.remove(shortcode)
+                self.evicted_posts += 1
+            self.evicted_bytes += freed
+            print(f"Cleanup: Evicted {freed} bytes from download store")
+        self.last_eviction_at = time.time()
+        self.last_eviction_seconds = time.monotonic() - started
+        return freed
+
+    def sweep_orphans(self, max_age: float, legacy_max_age: float):
+        """
+        Remove post and staging directories that are not in the index once
+        older than max_age seconds. Legacy timestamp directories are still
+        served by the static mount and keep their old retention,
+        legacy_max_age seconds.
+        """
+        now = time.time()
+        with self._lock:
+            indexed = {row[0] for row in self._conn.execute("SELECT shortcode FROM posts")}
+        for parent, skip in ((self.root, indexed), (self.staging_root, set())):
+            for name in os.listdir(parent):
+                path = os.path.join(parent, name)
+                legacy = parent == self.root and LEGACY_DIR.match(name)
+                try:
+                    if name in skip or not os.path.isdir(path):
+                        continue
+                    if now - os.path.getmtime(path) <= (legacy_max_age if legacy else max_age):
+                        continue
+                except OSError:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                self.orphans_removed += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            posts, logical = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_size), 0) FROM posts"
+            ).fetchone()
+            blobs, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+            # Only hardlinked copies share the blob's bytes; copied fallbacks save nothing.
+            saved = self._conn.execute(
+                "SELECT COALESCE(SUM((n - 1) * size), 0) FROM ("
+                "SELECT size, COUNT(*) AS n FROM files WHERE linked = 1 GROUP BY sha256) WHERE n > 1"
+            ).fetchone()[0]
+        return {
+            "posts": posts,
+            "blobs": blobs,
+            "bytes": stored,
+            "logical_bytes": logical,
+            "dedup_saved_bytes": saved,
+            "eviction_runs": self.eviction_runs,
+            "evicted_posts": self.evicted_posts,
+            "evicted_bytes": self.evicted_bytes,
+            "orphans_removed": self.orphans_removed,
+            "last_eviction_at": self.last_eviction_at,
+            "last_eviction_seconds": round(self.last_eviction_seconds, 4),
+        }
+
+
+async def run_eviction(store: DownloadStore):
+    """Background task: keep the download store within its byte budget."""
+    while True:
+        try:
+            await asyncio.to_thread(
+                store.evict,
+                settings.download_cache_high_watermark,
+                settings.download_cache_low_watermark
+            )
+            await asyncio.to_thread(
+                store.sweep_orphans,
+                settings.download_orphan_max_age,
+                settings.download_legacy_max_age
+            )
+        except Exception as e:
+            print(f"Warning: Error during download eviction: {e}")
+        await asyncio.sleep(settings.download_eviction_interval)
+
+
+download_store = DownloadStore(
+    settings.downloads_dir,
+    settings.downloads_staging_dir,
+    settings.downloads_index_path,
+    settings.downloads_blobs_dir,
+)
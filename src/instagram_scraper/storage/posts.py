@@ -0,0 +1,170 @@
+"""Optional SQLite store of scraped profiles and posts for offline queries."""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+from ..config.settings import settings
+from ..models.post import PostModel
+from ..models.profile import ProfileModel
+
+SORT_COLUMNS = ("timestamp", "likes", "comments")
+POST_COLUMNS = (
+    "shortcode", "username", "caption", "likes", "comments", "timestamp",
+    "is_video", "media_type", "accessibility_caption", "scraped_at",
+)
+
+
+class PostStore:
+    """
+    Profiles and posts upserted from scrape results. Posts are keyed by
+    shortcode and indexed by username/timestamp, likes and media_type, so
+    filtered and sorted reads never touch Instagram.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                username TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                scraped_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS posts (
+                shortcode TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                caption TEXT,
+                likes INTEGER NOT NULL,
+                comments INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                is_video INTEGER NOT NULL,
+                media_type TEXT NOT NULL,
+                accessibility_caption TEXT,
+                scraped_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS posts_username_timestamp ON posts(username, timestamp);
+            CREATE INDEX IF NOT EXISTS posts_timestamp ON posts(timestamp);
+            CREATE INDEX IF NOT EXISTS posts_likes ON posts(likes);
+            CREATE INDEX IF NOT EXISTS posts_media_type ON posts(media_type);
+            """
+        )
+        self._conn.commit()
+
+    def upsert_profile(self, profile: ProfileModel):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO profiles (username, data, scraped_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET data = excluded.data, scraped_at = excluded.scraped_at",
+                (profile.username.lower(), profile.model_dump_json(), time.time())
+            )
+            self._conn.commit()
+
+    def get_profile(self, username: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, scraped_at FROM profiles WHERE username = ?", (username.lower(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row["data"]), "scraped_at": row["scraped_at"]}
+
+    def upsert_posts(self, username: str, posts: List[PostModel]):
+        """One transaction per batch; counters are refreshed on conflict."""
+        if not posts:
+            return
+        now = time.time()
+        rows = [
+            (
+                post.shortcode, username.lower(), post.caption, post.likes, post.comments,
+                post.timestamp, int(post.is_video), post.media_type, post.accessibility_caption, now,
+            )
+            for post in posts
+        ]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in POST_COLUMNS[1:])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO posts ({', '.join(POST_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(POST_COLUMNS))}) "
+                f"ON CONFLICT(shortcode) DO UPDATE SET {updates}",
+                rows
+            )
+
+    def query_posts(
+        self,
+        username: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        media_type: Optional[str] = None,
+        is_video: Optional[bool] = None,
+        min_likes: Optional[int] = None,
+        sort: str = "timestamp",
+        descending: bool = True,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[Dict[str, object]]:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+        clauses, params = [], []
+        for clause, value in (
+            ("username = ?", username.lower() if username else None),
+            ("timestamp >= ?", since),
+            ("timestamp < ?", until),
+            ("media_type = ?", media_type),
+            ("is_video = ?", None if is_video is None else int(is_video)),
+            ("likes >= ?", min_likes),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM posts {where} ORDER BY {sort} {direction}, shortcode LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [{**dict(row), "is_video": bool(row["is_video"])} for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            profiles = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+            posts = self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        return {"profiles": profiles, "posts": posts}
+
+
+async def persisting(
+    store: Optional[PostStore],
+    username: str,
+    posts: AsyncGenerator[PostModel, None],
+    batch_size: int = settings.post_store_batch_size
+) -> AsyncGenerator[PostModel, None]:
+    """
+    Pass posts through unchanged, upserting them in batches when a store is
+    set. Closing this generator also closes (and so stops) the source.
+    """
+    batch: List[PostModel] = []
+    try:
+        async for post in posts:
+            if store is not None:
+                batch.append(post)
+                if len(batch) >= batch_size:
+                    await asyncio.to_thread(store.upsert_posts, username, batch)
+                    batch = []
+            yield post
+    finally:
+        # Keep what was fetched even if the consumer stopped early.
+        if store is not None and batch:
+            await asyncio.to_thread(store.upsert_posts, username, batch)
+        await posts.aclose()
+
+
+post_store = PostStore(settings.post_store_path) if settings.post_store_enabled else None
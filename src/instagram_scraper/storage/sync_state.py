@@ -0,0 +1,108 @@
+"""Per-user sync state: high-water marks and saved pagination cursors."""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+from ..config.settings import settings
+
+
+@dataclass
+class SyncState:
+    """
+    newest_* is the high-water mark: the newest post already synced.
+    gap_* records an unfinished incremental run (more new posts than one
+    poll's budget): paging resumes at gap_cursor and stops at the gap_*
+    mark. backfill_cursor is where a deep backfill into older posts resumes.
+    """
+    username: str
+    user_id: Optional[str] = None
+    newest_timestamp: Optional[int] = None
+    newest_shortcode: Optional[str] = None
+    gap_cursor: Optional[str] = None
+    gap_timestamp: Optional[int] = None
+    gap_shortcode: Optional[str] = None
+    backfill_cursor: Optional[str] = None
+    backfill_complete: bool = False
+    synced_at: Optional[float] = None
+
+    @property
+    def newest_mark(self) -> Optional[Tuple[int, str]]:
+        if self.newest_timestamp is None:
+            return None
+        return self.newest_timestamp, self.newest_shortcode
+
+    @property
+    def gap_mark(self) -> Optional[Tuple[int, str]]:
+        if self.gap_cursor is None:
+            return None
+        return self.gap_timestamp, self.gap_shortcode
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+class SyncStateStore:
+    """One SyncState row per username in SQLite (WAL)."""
+
+    _COLUMNS = (
+        "username", "user_id", "newest_timestamp", "newest_shortcode",
+        "gap_cursor", "gap_timestamp", "gap_shortcode",
+        "backfill_cursor", "backfill_complete", "synced_at",
+    )
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "username TEXT PRIMARY KEY, user_id TEXT, "
+            "newest_timestamp INTEGER, newest_shortcode TEXT, "
+            "gap_cursor TEXT, gap_timestamp INTEGER, gap_shortcode TEXT, "
+            "backfill_cursor TEXT, backfill_complete INTEGER NOT NULL DEFAULT 0, "
+            "synced_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, username: str) -> SyncState:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM sync_state WHERE username = ?",
+                (username.lower(),)
+            ).fetchone()
+        if row is None:
+            return SyncState(username=username.lower())
+        state = SyncState(*row)
+        state.backfill_complete = bool(state.backfill_complete)
+        return state
+
+    def save(self, state: SyncState):
+        state.synced_at = time.time()
+        values = tuple(getattr(state, column) for column in self._COLUMNS)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO sync_state ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                values
+            )
+            self._conn.commit()
+
+    def reset(self, username: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sync_state WHERE username = ?", (username.lower(),))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            users, gaps, backfilling = self._conn.execute(
+                "SELECT COUNT(*), COUNT(gap_cursor), "
+                "COALESCE(SUM(backfill_cursor IS NOT NULL AND NOT backfill_complete), 0) FROM sync_state"
+            ).fetchone()
+        return {"users": users, "open_gaps": gaps, "backfills_pending": backfilling}
+
+
+sync_store = SyncStateStore(settings.sync_state_path)
@@ -0,0 +1,112 @@
+"""Thumbnail derivatives cached on disk by source content hash."""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+from ..config.settings import settings
+
+
+class ThumbnailStore:
+    """
+    Derivatives live at <root>/<ab>/<sha256>_<size>.<fmt>, where sha256 is
+    the hash of the source image (or video frame), so posts sharing an
+    image share its thumbnails. An SQLite index remembers which source hash
+    each (shortcode, item) had, letting repeat requests skip the source fetch.
+    A derivative's mtime is bumped whenever it is served; prune() removes
+    the ones left unserved for too long.
+    """
+
+    def __init__(self, root: str, index_path: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "shortcode TEXT NOT NULL, idx INTEGER NOT NULL, sha256 TEXT NOT NULL, "
+            "PRIMARY KEY (shortcode, idx))"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.renders = 0
+
+    def source_hash(self, shortcode: str, index: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM sources WHERE shortcode = ? AND idx = ?", (shortcode, index)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember_source(self, shortcode: str, index: int, sha256: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (shortcode, idx, sha256) VALUES (?, ?, ?)",
+                (shortcode, index, sha256)
+            )
+            self._conn.commit()
+
+    def path_for(self, sha256: str, size: int, fmt: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}_{size}.{fmt}")
+
+    def get(self, sha256: str, size: int, fmt: str) -> Optional[str]:
+        path = self.path_for(sha256, size, fmt)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, sha256: str, size: int, fmt: str, data: bytes) -> str:
+        path = self.path_for(sha256, size, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.renders += 1
+        return path
+
+    def prune(self, max_age: float) -> int:
+        """Remove derivatives not served for max_age seconds; returns how many."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(shard.path)
+            except OSError:
+                pass
+        if removed:
+            print(f"DEBUG: Pruned {removed} unused thumbnail(s)")
+        return removed
+
+    def stats(self):
+        return {"hits": self.hits, "renders": self.renders}
+
+
+async def run_pruning(store: ThumbnailStore):
+    """Background task: drop thumbnails that have not been served for a while."""
+    while True:
+        try:
+            await asyncio.to_thread(store.prune, settings.thumbnail_cache_max_age)
+        except Exception as e:
+            print(f"Warning: Error during thumbnail pruning: {e}")
+        await asyncio.sleep(settings.download_eviction_interval)
+
+
+thumbnail_store = ThumbnailStore(settings.thumbnails_dir, settings.thumbnails_index_path)
@@ -0,0 +1,75 @@
+"""Persistent username -> numeric user id mapping."""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from ..config.settings import settings
+
+
+class UserIdCache:
+    """
+    Filled by every profile scrape and read by /posts and /sync, so they
+    can page a timeline without loading the whole profile first. Ids never
+    change but usernames can be renamed, hence the (long) TTL.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_ids ("
+            "username TEXT PRIMARY KEY, user_id TEXT NOT NULL, resolved_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, resolved_at FROM user_ids WHERE username = ?", (username.lower(),)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, username: str, user_id: str) -> Optional[str]:
+        """Store the mapping; returns the id it replaces when that was a different one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id FROM user_ids WHERE username = ?", (username.lower(),)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_ids (username, user_id, resolved_at) VALUES (?, ?, ?)",
+                (username.lower(), str(user_id), time.time())
+            )
+            self._conn.commit()
+        if row is not None and row[0] != str(user_id):
+            return row[0]
+        return None
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM user_ids WHERE username = ?", (username.lower(),))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM user_ids").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+user_id_cache = UserIdCache(settings.user_id_cache_path, settings.user_id_cache_ttl)
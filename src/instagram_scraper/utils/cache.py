@@ -0,0 +1,181 @@
+"""LRU + TTL cache for resolved MediaModel results."""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from ..config.settings import settings
+from ..models.media import MediaModel
+
+
+def cdn_expiry(urls: Iterable[str]) -> Optional[float]:
+    """
+    Earliest expiry (Unix seconds) encoded in the `oe=` parameter of
+    Instagram CDN URLs. The value is a hex timestamp; None if no URL has one.
+    """
+    expiries = []
+    for url in urls:
+        values = parse_qs(urlparse(url).query).get("oe")
+        if not values:
+            continue
+        try:
+            expiries.append(int(values[0], 16))
+        except ValueError:
+            continue
+    return min(expiries) if expiries else None
+
+
+class MemoryBackend:
+    """In-process LRU store of (value, expires_at) pairs."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        item = self._data.get(key)
+        if item is not None:
+            self._data.move_to_end(key)
+        return item
+
+    def set(self, key: str, value: str, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    SQLite store so several uvicorn workers can share one cache file.
+    LRU order is tracked with an access timestamp column.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_media_cache_accessed ON media_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM media_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE media_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+                self._conn.commit()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM media_cache WHERE key IN ("
+                "SELECT key FROM media_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM media_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM media_cache").fetchone()[0]
+
+
+class MediaCache:
+    """
+    Caches MediaModel by shortcode. Each entry lives until shortly before
+    the earliest CDN link in it expires, capped at media_cache_max_ttl.
+    """
+
+    def __init__(self, backend, max_ttl: float, default_ttl: float, expiry_margin: float):
+        self.backend = backend
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def ttl_for(self, media: MediaModel) -> float:
+        now = time.time()
+        expiry = cdn_expiry(media.media_urls + media.thumbnail_urls + [media.thumbnail_url])
+        if expiry is None:
+            return min(self.default_ttl, self.max_ttl)
+        return min(expiry - now - self.expiry_margin, self.max_ttl)
+
+    def get(self, key: str) -> Optional[MediaModel]:
+        item = self.backend.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at > time.time():
+                self.hits += 1
+                return MediaModel.model_validate_json(value)
+            self.backend.delete(key)
+        self.misses += 1
+        return None
+
+    def set(self, key: str, media: MediaModel):
+        ttl = self.ttl_for(media)
+        if ttl <= 0:
+            self.skipped += 1
+            return
+        self.backend.set(key, media.model_dump_json(), time.time() + ttl)
+
+    def invalidate(self, key: str):
+        self.backend.delete(key)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "skipped_expiring": self.skipped,
+        }
+
+
+def _build_backend():
+    if settings.media_cache_backend == "sqlite":
+        return SQLiteBackend(settings.media_cache_path, settings.media_cache_max_entries)
+    return MemoryBackend(settings.media_cache_max_entries)
+
+
+media_cache = MediaCache(
+    _build_backend(),
+    max_ttl=settings.media_cache_max_ttl,
+    default_ttl=settings.media_cache_default_ttl,
+    expiry_margin=settings.media_cache_expiry_margin,
+)
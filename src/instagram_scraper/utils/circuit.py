@@ -0,0 +1,104 @@
+"""Circuit breakers for media resolution strategies."""
+
+import time
+from typing import Dict, List, Optional, Tuple
+from ..config.settings import settings
+from .proxies import redact_proxy
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures so callers skip the
+    strategy. After reset_seconds one probe call is let through (half-open):
+    success closes the breaker, failure opens it for another window.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self.probe_started_at = None
+        if self.state == HALF_OPEN:
+            # A probe that never reported back (e.g. cancelled) is replaced.
+            if self.probe_started_at is None or now - self.probe_started_at >= self.reset_seconds:
+                self.probe_started_at = now
+                return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probe_started_at = None
+
+    def record_neutral(self):
+        """
+        An outcome that says nothing about the strategy's health (e.g. a
+        deleted post): the failure count is kept and a half-open probe slot
+        is freed for the next caller.
+        """
+        if self.state == HALF_OPEN:
+            self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probe_started_at = None
+
+    def snapshot(self) -> Dict[str, object]:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+            "retry_in_seconds": round(retry_in, 1),
+        }
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per (strategy, proxy) pair, created on demand."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[Tuple[str, Optional[str]], CircuitBreaker] = {}
+
+    def get(self, strategy: str, proxy: Optional[str] = None) -> CircuitBreaker:
+        key = (strategy, proxy)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            self._breakers[key] = breaker
+        return breaker
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        return [
+            {"strategy": strategy, "proxy": redact_proxy(proxy), **breaker.snapshot()}
+            for (strategy, proxy), breaker in self._breakers.items()
+        ]
+
+
+media_breakers = BreakerRegistry(settings.breaker_failure_threshold, settings.breaker_reset_seconds)
@@ -0,0 +1,155 @@
+"""Media file downloaders: native httpx streaming for CDN links, yt-dlp otherwise."""
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import urlparse
+import httpx
+import yt_dlp
+from ..config.settings import settings
+from .http_pool import client_pool
+
+DIRECT_HOST_SUFFIXES = ("cdninstagram.com", "fbcdn.net")
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/heic": "heic",
+    "image/gif": "gif",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+}
+
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+@dataclass
+class DownloadResult:
+    path: str
+    size: int
+    content_type: str
+    sha256: str
+
+
+def is_direct_url(url: str) -> bool:
+    """True for plain CDN file links that need no yt-dlp extraction."""
+    host = (urlparse(url).hostname or "").lower()
+    return host.endswith(DIRECT_HOST_SUFFIXES)
+
+
+def extension_for(content_type: str, url: str = "") -> str:
+    """File extension from a Content-Type header, falling back to the URL path."""
+    mime = content_type.split(";")[0].strip().lower()
+    if mime in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[mime]
+    ext = os.path.splitext(urlparse(url).path)[1].lstrip(".").lower()
+    if ext == "jpeg":
+        return "jpg"
+    return ext or "file"
+
+
+async def stream_download(
+    url: str,
+    dest_stem: str,
+    client: Optional[httpx.AsyncClient] = None,
+    progress: Optional[ProgressCallback] = None
+) -> DownloadResult:
+    """
+    Stream url to disk in download_chunk_size chunks.
+    Bytes go to dest_stem + ".part", which is renamed atomically to
+    dest_stem + "." + ext once complete. The SHA-256 of the content is
+    computed while streaming, and progress(downloaded, total) is called
+    after every chunk.
+
+    Transfers that fail mid-way are retried with a Range request from where
+    the .part file ends. This only covers retries within one call: callers
+    stage into a fresh directory per request and remove it afterwards, so
+    an interrupted request starts over next time. A later request may get a
+    different signed CDN URL, and a spliced file would not be detected.
+    """
+    client = client or client_pool.get_client(None)
+    part_path = f"{dest_stem}.part"
+
+    for attempt in range(settings.max_retries):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            async with client.stream("GET", url, headers=headers) as resp:
+                if resp.status_code == 416:
+                    # Stale partial file larger than the resource; start over.
+                    os.remove(part_path)
+                    continue
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    offset = 0
+                digest = hashlib.sha256()
+                if offset:
+                    await asyncio.to_thread(_hash_prefix, digest, part_path)
+                content_type = resp.headers.get("content-type", "")
+                length = resp.headers.get("content-length")
+                total = offset + int(length) if length and length.isdigit() else None
+                downloaded = offset
+                with open(part_path, "ab" if offset else "wb") as f:
+                    async for chunk in resp.aiter_bytes(settings.download_chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        downloaded += len(chunk)
+                        if progress is not None:
+                            progress(downloaded, total)
+                        if settings.download_fsync == "always":
+                            f.flush()
+                            await asyncio.to_thread(os.fsync, f.fileno())
+                    f.flush()
+                    if settings.download_fsync in ("always", "end"):
+                        await asyncio.to_thread(os.fsync, f.fileno())
+            break
+        except httpx.TransportError as e:
+            print(f"DEBUG: CDN download error on attempt {attempt + 1}: {e}")
+            if attempt == settings.max_retries - 1:
+                raise
+    else:
+        raise Exception("Max retries exceeded")
+
+    final_path = f"{dest_stem}.{extension_for(content_type, url)}"
+    os.replace(part_path, final_path)
+    return DownloadResult(final_path, os.path.getsize(final_path), content_type, digest.hexdigest())
+
+
+def _hash_prefix(digest, path: str):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def ytdlp_download(url: str, output_dir: str, stem: str, progress: Optional[ProgressCallback] = None) -> str:
+    """
+    Blocking yt-dlp download of one URL; run it on download_pool.
+    extract_info(download=True) downloads and reports the final filename in
+    one pass, so no second request is needed to learn the extension.
+    progress is called from the worker thread.
+    """
+    ydl_opts = {
+        'outtmpl': f'{output_dir}/{stem}.%(ext)s',
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'format': 'best',
+    }
+    if progress is not None:
+        def hook(d):
+            if d.get('status') in ('downloading', 'finished'):
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                progress(d.get('downloaded_bytes') or 0, int(total) if total else None)
+        ydl_opts['progress_hooks'] = [hook]
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        downloads = info.get('requested_downloads') or []
+        if downloads and downloads[0].get('filepath'):
+            return downloads[0]['filepath']
+        return ydl.prepare_filename(info)
@@ -0,0 +1,120 @@
+"""Streaming encoders for post exports (CSV, Arrow IPC, Parquet)."""
+
+import csv
+import io
+import zlib
+from typing import AsyncIterator, List
+from ..models.post import PostModel
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+POST_FIELDS = list(PostModel.model_fields.keys())
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def csv_chunks(posts: AsyncIterator[PostModel]) -> AsyncIterator[bytes]:
+    """One chunk for the header, then one per post; nothing is accumulated."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=POST_FIELDS)
+
+    def take() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writeheader()
+    yield take()
+    async for post in posts:
+        writer.writerow(post.model_dump())
+        yield take()
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each batch."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("shortcode", pa.string()),
+        ("caption", pa.string()),
+        ("likes", pa.int64()),
+        ("comments", pa.int64()),
+        ("timestamp", pa.int64()),
+        ("is_video", pa.bool_()),
+        ("media_type", pa.string()),
+        ("accessibility_caption", pa.string()),
+    ])
+
+
+async def arrow_chunks(
+    posts: AsyncIterator[PostModel],
+    fmt: str = "arrow",
+    batch_size: int = 50
+) -> AsyncIterator[bytes]:
+    """
+    Write posts as Arrow record batches (IPC stream) or Parquet row groups of
+    batch_size rows. Only one batch is held in memory; Parquet's footer is
+    sent when the stream closes.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(output, schema)
+        write = writer.write_table
+        to_frame = pa.Table.from_pylist
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+        write = writer.write_batch
+        to_frame = pa.RecordBatch.from_pylist
+
+    rows = []
+    async for post in posts:
+        rows.append(post.model_dump())
+        if len(rows) >= batch_size:
+            write(to_frame(rows, schema=schema))
+            rows = []
+            yield sink.drain()
+    if rows:
+        write(to_frame(rows, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """gzip-encode a byte stream, flushing per chunk so output keeps flowing."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
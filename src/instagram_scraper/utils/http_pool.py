@@ -0,0 +1,75 @@
+"""Process-wide pool of keep-alive HTTP clients, one per proxy."""
+
+from typing import Dict, Optional
+import httpx
+from fake_useragent import UserAgent
+from ..config.settings import settings
+from .headers import get_headers
+
+ua = UserAgent()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ClientPool:
+    """
+    Hands out long-lived httpx.AsyncClient instances keyed by proxy URL.
+    Clients keep their connections alive between scraper calls, so repeated
+    requests to instagram.com skip the TCP/TLS handshake.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Optional[str], httpx.AsyncClient] = {}
+        self._http2 = settings.http2 and _http2_available()
+        if settings.http2 and not self._http2:
+            print("DEBUG: HTTP2 requested but 'h2' is not installed, using HTTP/1.1")
+
+    def _build_client(self, proxy: Optional[str]) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            timeout=settings.http_timeout,
+            headers=get_headers(ua),
+            proxy=proxy,
+            limits=limits,
+            http2=self._http2,
+        )
+
+    def get_client(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        """Return the pooled client for a proxy, creating it on first use."""
+        client = self._clients.get(proxy)
+        if client is None or client.is_closed:
+            client = self._build_client(proxy)
+            self._clients[proxy] = client
+        return client
+
+    def start(self, proxies: Optional[list] = None):
+        """Pre-create clients for the direct route and every configured proxy."""
+        self.get_client(None)
+        for proxy in proxies or []:
+            self.get_client(proxy)
+
+    async def aclose(self):
+        """Close every pooled client; called at application shutdown."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self._clients),
+            "http2": self._http2,
+        }
+
+
+client_pool = ClientPool()
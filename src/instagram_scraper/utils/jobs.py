@@ -0,0 +1,260 @@
+"""Background jobs with progress reporting, consumed by polling or SSE."""
+
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from ..config.settings import settings
+from .workers import PoolFullError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """One unit of work plus the byte-level progress of each of its files."""
+
+    def __init__(
+        self,
+        key: str,
+        fn: Optional[Callable[["Job"], Awaitable[Dict[str, Any]]]],
+        shortcode: Optional[str] = None,
+        policy: Optional[str] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.shortcode = shortcode or key
+        self.policy = policy
+        self.fn = fn
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._subscribers: List[asyncio.Queue] = []
+        self._notified_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def set_items(self, count: int):
+        self.files = [{"index": i + 1, "downloaded": 0, "total": None, "done": False} for i in range(count)]
+        self._notify(force=True)
+
+    def progress(self, index: int, downloaded: int, total: Optional[int], done: bool = False):
+        """Record bytes received for file `index` (1-based)."""
+        if not 0 < index <= len(self.files):
+            return
+        entry = self.files[index - 1]
+        entry["downloaded"] = downloaded
+        entry["total"] = total if total else entry["total"]
+        entry["done"] = entry["done"] or done
+        self._notify(force=done)
+
+    def snapshot(self) -> Dict[str, Any]:
+        totals = [entry["total"] for entry in self.files]
+        return {
+            "id": self.id,
+            "shortcode": self.shortcode,
+            "policy": self.policy,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "downloaded": sum(entry["downloaded"] for entry in self.files),
+            "total": sum(totals) if totals and None not in totals else None,
+            "files": [dict(entry) for entry in self.files],
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def _notify(self, force: bool = False):
+        """Push a snapshot to subscribers, at most every job_progress_interval."""
+        now = time.monotonic()
+        if not force and now - self._notified_at < settings.job_progress_interval:
+            return
+        self._notified_at = now
+        snapshot = self.snapshot()
+        for queue in self._subscribers:
+            if queue.full():
+                # Slow reader: drop its oldest update, it only needs the latest.
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    async def events(self, heartbeat: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield the current snapshot, then every update until the job
+        finishes. None is yielded after `heartbeat` quiet seconds.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=16)
+        self._subscribers.append(queue)
+        try:
+            snapshot = self.snapshot()
+            yield snapshot
+            while snapshot["status"] not in (DONE, FAILED):
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield snapshot
+        finally:
+            self._subscribers.remove(queue)
+
+
+class SharedProgress(Job):
+    """
+    Progress record of one download key. Updates are mirrored into every
+    watching job, so jobs coalesced onto an in-flight download (whose
+    progress callbacks belong to the leader) see per-file progress too.
+    """
+
+    def __init__(self, key: str):
+        super().__init__(key, None)
+        self.watchers: List[Job] = []
+        self.users = 0
+
+    def watch(self, job: Job):
+        """Start mirroring into job, beginning with the progress so far."""
+        job.files = [dict(entry) for entry in self.files]
+        self.watchers.append(job)
+        job._notify(force=True)
+
+    def unwatch(self, job: Job):
+        if job in self.watchers:
+            self.watchers.remove(job)
+
+    def set_items(self, count: int):
+        super().set_items(count)
+        for job in self.watchers:
+            job.set_items(count)
+
+    def progress(self, index: int, downloaded: int, total: Optional[int], done: bool = False):
+        super().progress(index, downloaded, total, done)
+        for job in self.watchers:
+            job.progress(index, downloaded, total, done)
+
+    def _notify(self, force: bool = False):
+        pass
+
+
+class ProgressRegistry:
+    """One SharedProgress per download key, kept while a download or a job uses it."""
+
+    def __init__(self):
+        self._shared: Dict[str, SharedProgress] = {}
+
+    def acquire(self, key: str) -> SharedProgress:
+        shared = self._shared.get(key)
+        if shared is None:
+            shared = self._shared[key] = SharedProgress(key)
+        shared.users += 1
+        return shared
+
+    def release(self, shared: SharedProgress):
+        shared.users -= 1
+        if shared.users == 0 and self._shared.get(shared.key) is shared:
+            del self._shared[shared.key]
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed number of asyncio workers fed by a bounded queue.
+    Submitting a key that already has an unfinished job returns that job.
+    Finished jobs are kept for job_ttl seconds so their status can be read.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, ttl: float):
+        self.workers = workers
+        self.ttl = ttl
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_limit = queue_limit
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, Job] = {}
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_workers(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_limit)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(
+        self,
+        key: str,
+        fn: Callable[[Job], Awaitable[Dict[str, Any]]],
+        shortcode: Optional[str] = None,
+        policy: Optional[str] = None
+    ) -> Job:
+        self._prune()
+        existing = self._active.get(key)
+        if existing is not None:
+            return existing
+        self._ensure_workers()
+        job = Job(key, fn, shortcode, policy)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise PoolFullError("Job queue is full")
+        self._jobs[job.id] = job
+        self._active[key] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            job._notify(force=True)
+            try:
+                job.result = await job.fn(job)
+                job.status = DONE
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.status, job.error = FAILED, "cancelled"
+                raise
+            except Exception as e:
+                print(f"DEBUG: Job {job.id} ({job.key}) failed: {e}")
+                job.status = FAILED
+                job.error = getattr(e, "detail", None) or str(e)
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                self._active.pop(job.key, None)
+                job._notify(force=True)
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active": len(self._active),
+            "tracked": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+download_jobs = JobManager(settings.job_workers, settings.job_queue_limit, settings.job_ttl)
+download_progress = ProgressRegistry()
@@ -0,0 +1,32 @@
+"""Rolling latency samples with percentile estimates."""
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """Keeps the last `window` latencies (seconds) of one operation."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        def rounded(value):
+            return round(value, 4) if value is not None else None
+        return {
+            "samples": len(self._samples),
+            "p50": rounded(self.percentile(0.5)),
+            "p95": rounded(self.percentile(0.95)),
+        }
@@ -1,5 +1,11 @@
 """Parsing helpers."""
 
+import re
+from typing import Optional
+from urllib.parse import urlparse
+
+SHORTCODE_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
 def parse_graphql_data(response_data: dict, key_path: str) -> dict:
     """Extract nested GraphQL data, e.g., 'data.user.edge_owner_to_timeline_media'."""
     keys = key_path.split(".")
@@ -9,4 +15,21 @@ def parse_graphql_data(response_data: dict, key_path: str) -> dict:
             data = data[key]
         else:
             return {}
-    return data
\ No newline at end of file
+    return data
+
+def extract_shortcode(value: str) -> Optional[str]:
+    """
+    Shortcode from a post/reel URL (/p/<code>/ or /reel/<code>/) or a bare
+    shortcode. Raises ValueError for URLs without either path segment.
+    """
+    value = value.strip()
+    if "/" not in value:
+        return value if SHORTCODE_RE.match(value) else None
+    path = urlparse(value).path
+    if '/p/' in path:
+        shortcode = path.split('/p/')[1].split('/')[0]
+    elif '/reel/' in path:
+        shortcode = path.split('/reel/')[1].split('/')[0]
+    else:
+        raise ValueError("Invalid IG URL; must contain /p/ or /reel/ for shortcode")
+    return shortcode or None
@@ -1,18 +1,163 @@
 """Proxy rotation."""
 
+import asyncio
 import random
-from typing import Optional, Dict, Any
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque, List
+from urllib.parse import urlsplit
+from ..config.settings import settings
 
-def get_proxy(proxies_list: list) -> Optional[str]:
-    """
-    Get a random proxy from the list.
-    Returns proxy URL string for httpx, or None if no proxies available.
-    httpx accepts: "http://proxy:port" or "socks5://proxy:port"
-    """
-    if not proxies_list:
-        return None
-    proxy_url = random.choice(proxies_list)
+def normalize_proxy(proxy_url: str) -> str:
+    """Add a default http:// scheme to bare host:port proxy entries."""
     proxy_url = proxy_url.strip()
     if not proxy_url.startswith(("http://", "https://", "socks5://", "socks4://")):
         proxy_url = f"http://{proxy_url}"
-    return proxy_url
\ No newline at end of file
+    return proxy_url
+
+def redact_proxy(proxy_url: Optional[str]) -> Optional[str]:
+    """Proxy label safe to log or publish: scheme://host:port, without credentials."""
+    if proxy_url is None:
+        return None
+    parts = urlsplit(proxy_url)
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    port = f":{parts.port}" if parts.port else ""
+    return f"{parts.scheme}://{host}{port}"
+
+class ProxyState:
+    """Health and rate-limit bookkeeping for one proxy."""
+
+    def __init__(self, url: str, burst: int):
+        self.url = url
+        self.successes = 0
+        self.failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.recent_blocks: Deque[float] = deque()
+        self.quarantined_until = 0.0
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+
+    def score(self) -> float:
+        """Selection weight: smoothed success rate, penalised by latency and blocks."""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return success_rate / (1.0 + latency) / (1 + len(self.recent_blocks))
+
+
+class ProxyPool:
+    """
+    Chooses proxies weighted by health instead of uniformly at random.
+    Proxies that collect block_threshold 429/403 responses within
+    block_window seconds are quarantined for quarantine_seconds. Each proxy
+    also has a token bucket capping its request rate.
+    """
+
+    def __init__(
+        self,
+        proxies: List[str],
+        rate: float,
+        burst: int,
+        quarantine_seconds: float,
+        block_threshold: int,
+        block_window: float,
+        ewma_alpha: float = 0.3
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.quarantine_seconds = quarantine_seconds
+        self.block_threshold = block_threshold
+        self.block_window = block_window
+        self.ewma_alpha = ewma_alpha
+        self._states: Dict[str, ProxyState] = {}
+        for proxy in proxies:
+            url = normalize_proxy(proxy)
+            self._states.setdefault(url, ProxyState(url, burst))
+
+    @property
+    def proxies(self) -> List[str]:
+        return list(self._states)
+
+    def _prune(self, state: ProxyState, now: float):
+        while state.recent_blocks and now - state.recent_blocks[0] > self.block_window:
+            state.recent_blocks.popleft()
+
+    def choose(self, exclude: Optional[str] = None) -> Optional[str]:
+        """Pick a healthy proxy, or None when no proxies are configured."""
+        if not self._states:
+            return None
+        now = time.monotonic()
+        for state in self._states.values():
+            self._prune(state, now)
+        states = [s for s in self._states.values() if s.url != exclude] or list(self._states.values())
+        healthy = [s for s in states if s.quarantined_until <= now]
+        if not healthy:
+            # Everything is quarantined: use the proxy that gets out soonest.
+            return min(states, key=lambda s: s.quarantined_until).url
+        return random.choices(healthy, weights=[s.score() for s in healthy])[0].url
+
+    async def acquire(self, proxy: Optional[str]):
+        """Wait for a token from the proxy's bucket."""
+        state = self._states.get(proxy)
+        if state is None or self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            state.tokens = min(self.burst, state.tokens + (now - state.last_refill) * self.rate)
+            state.last_refill = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return
+            await asyncio.sleep((1 - state.tokens) / self.rate)
+
+    def record_success(self, proxy: Optional[str], latency: float):
+        state = self._states.get(proxy)
+        if state is None:
+            return
+        state.successes += 1
+        if state.latency_ewma is None:
+            state.latency_ewma = latency
+        else:
+            state.latency_ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * state.latency_ewma
+
+    def record_failure(self, proxy: Optional[str], status_code: Optional[int] = None):
+        state = self._states.get(proxy)
+        if state is None:
+            return
+        state.failures += 1
+        if status_code in (429, 403):
+            now = time.monotonic()
+            state.recent_blocks.append(now)
+            self._prune(state, now)
+            if len(state.recent_blocks) >= self.block_threshold:
+                state.quarantined_until = now + self.quarantine_seconds
+                state.recent_blocks.clear()
+                print(f"DEBUG: Quarantining proxy {redact_proxy(proxy)} for {self.quarantine_seconds}s")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        result = []
+        for state in self._states.values():
+            self._prune(state, now)
+            result.append({
+                "proxy": redact_proxy(state.url),
+                "successes": state.successes,
+                "failures": state.failures,
+                "latency_ewma": round(state.latency_ewma, 4) if state.latency_ewma is not None else None,
+                "recent_blocks": len(state.recent_blocks),
+                "quarantined_for": round(max(state.quarantined_until - now, 0.0), 1),
+                "tokens": round(min(self.burst, state.tokens + (now - state.last_refill) * self.rate), 2),
+                "score": round(state.score(), 4),
+            })
+        return result
+
+
+proxy_pool = ProxyPool(
+    settings.proxies_list,
+    rate=settings.proxy_rate_per_second,
+    burst=settings.proxy_burst,
+    quarantine_seconds=settings.proxy_quarantine_seconds,
+    block_threshold=settings.proxy_block_threshold,
+    block_window=settings.proxy_block_window,
+)
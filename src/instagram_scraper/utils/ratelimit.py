@@ -0,0 +1,211 @@
+"""Process-wide AIMD rate and concurrency limiter for instagram.com requests."""
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+from urllib.parse import urlparse
+from ..config.settings import settings
+
+
+class SharedLimiterState:
+    """
+    Optional SQLite file through which uvicorn workers share reductions.
+    Each worker writes its lowered limit/rate when throttled, and the others
+    adopt it the next time they sync.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=1.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS limiter_state ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), concurrency REAL NOT NULL, "
+            "rate REAL NOT NULL, backoff_until REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def read(self) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT concurrency, rate, backoff_until, updated_at FROM limiter_state WHERE id = 1"
+        ).fetchone()
+
+    def write(self, concurrency: float, rate: float, backoff_until: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO limiter_state (id, concurrency, rate, backoff_until, updated_at) "
+            "VALUES (1, ?, ?, ?, ?)",
+            (concurrency, rate, backoff_until, time.time())
+        )
+        self._conn.commit()
+
+
+class AdaptiveLimiter:
+    """
+    Additive-increase / multiplicative-decrease limiter shared by every
+    scraper. Callers queue FIFO for a concurrency slot and are then spaced
+    out to the current request rate. A 429 cuts both concurrency and rate
+    and pauses new requests for backoff_seconds; after recovery_seconds
+    without throttling, successes slowly raise them again.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int,
+        max_rate: float,
+        min_rate: float,
+        decrease_factor: float,
+        increase_step: float,
+        rate_increase: float,
+        recovery_seconds: float,
+        backoff_seconds: float,
+        shared: Optional[SharedLimiterState] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.rate_increase = rate_increase
+        self.recovery_seconds = recovery_seconds
+        self.backoff_seconds = backoff_seconds
+        self.shared = shared
+
+        self.concurrency = float(max_concurrency)
+        self.rate = max_rate
+        self.backoff_until = 0.0
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._next_start = 0.0
+        self._last_throttle = float("-inf")
+        self._synced_at = 0.0
+        self.throttles = 0
+        self.granted = 0
+        self._wait_total = 0.0
+
+    @staticmethod
+    def applies_to(url: str) -> bool:
+        host = (urlparse(url).hostname or "").lower()
+        return host == "instagram.com" or host.endswith(".instagram.com")
+
+    def _sync(self):
+        now = time.time()
+        if self.shared is None or now - self._synced_at < 1.0:
+            return
+        last_sync, self._synced_at = self._synced_at, now
+        try:
+            row = self.shared.read()
+        except sqlite3.Error:
+            return
+        if row is None or row[3] <= last_sync:
+            return
+        concurrency, rate, backoff_until, _ = row
+        self.concurrency = min(self.concurrency, concurrency)
+        self.rate = min(self.rate, rate)
+        # backoff_until is wall-clock in the shared file; convert to monotonic.
+        self.backoff_until = max(self.backoff_until, time.monotonic() + backoff_until - now)
+
+    def _grant(self):
+        while self._waiters and self._active < max(int(self.concurrency), self.min_concurrency):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    async def acquire(self):
+        self._sync()
+        enqueued_at = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._grant()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+        now = time.monotonic()
+        start_at = max(now, self._next_start, self.backoff_until)
+        self._next_start = start_at + 1.0 / self.rate
+        try:
+            if start_at > now:
+                await asyncio.sleep(start_at - now)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        self.granted += 1
+        self._wait_total += time.monotonic() - enqueued_at
+
+    def release(self):
+        self._active -= 1
+        self._grant()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_throttle(self):
+        """Multiplicative decrease, at most once per second of 429s."""
+        now = time.monotonic()
+        self.throttles += 1
+        if now - self._last_throttle < 1.0:
+            return
+        self._last_throttle = now
+        self.concurrency = max(float(self.min_concurrency), self.concurrency * self.decrease_factor)
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.backoff_until = max(self.backoff_until, now + self.backoff_seconds)
+        print(f"DEBUG: IG throttling, limiter down to {self.concurrency:.1f} concurrent / {self.rate:.2f} req/s")
+        if self.shared is not None:
+            try:
+                self.shared.write(self.concurrency, self.rate, time.time() + self.backoff_seconds)
+            except sqlite3.Error:
+                pass
+
+    def on_success(self):
+        """Additive increase once no 429 has been seen for recovery_seconds."""
+        if time.monotonic() - self._last_throttle < self.recovery_seconds:
+            return
+        self.concurrency = min(float(self.max_concurrency), self.concurrency + self.increase_step / self.concurrency)
+        self.rate = min(self.max_rate, self.rate + self.rate_increase)
+        self._grant()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency_limit": round(self.concurrency, 2),
+            "rate_per_second": round(self.rate, 3),
+            "active": self._active,
+            "queued": len(self._waiters),
+            "backoff_remaining": round(max(self.backoff_until - time.monotonic(), 0.0), 2),
+            "throttles": self.throttles,
+            "granted": self.granted,
+            "avg_wait_seconds": round(self._wait_total / self.granted, 4) if self.granted else 0.0,
+        }
+
+
+upstream_limiter = AdaptiveLimiter(
+    max_concurrency=settings.limiter_max_concurrency,
+    min_concurrency=settings.limiter_min_concurrency,
+    max_rate=settings.limiter_max_rate,
+    min_rate=settings.limiter_min_rate,
+    decrease_factor=settings.limiter_decrease_factor,
+    increase_step=settings.limiter_increase_step,
+    rate_increase=settings.limiter_rate_increase,
+    recovery_seconds=settings.limiter_recovery_seconds,
+    backoff_seconds=settings.limiter_backoff_seconds,
+    shared=SharedLimiterState(settings.limiter_state_path) if settings.limiter_state_path else None,
+)
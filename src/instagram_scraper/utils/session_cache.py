@@ -0,0 +1,94 @@
+"""TTL cache for the CSRF token and cookies used to bootstrap GraphQL calls."""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+from ..config.settings import settings
+
+
+@dataclass
+class SessionBootstrap:
+    csrf_token: str
+    cookies: Dict[str, str] = field(default_factory=dict)
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def cookie_header(self) -> str:
+        return "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+
+
+SessionFetcher = Callable[[], Awaitable[SessionBootstrap]]
+
+
+class SessionCache:
+    """
+    Stores one SessionBootstrap per client identity (the proxy URL, or None
+    for direct connections). Entries are refreshed in the background once
+    they enter the refresh margin, so callers rarely wait on a bootstrap.
+    """
+
+    def __init__(self, ttl: float, refresh_margin: float):
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self._entries: Dict[Optional[str], SessionBootstrap] = {}
+        self._inflight: Dict[Optional[str], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get(self, key: Optional[str], fetch: SessionFetcher) -> SessionBootstrap:
+        """Return a cached session for key, fetching one if absent or expired."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.fetched_at < self.ttl:
+            self.hits += 1
+            if now - entry.fetched_at >= self.ttl - self.refresh_margin:
+                self._refresh(key, fetch)
+            return entry
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def _refresh(self, key: Optional[str], fetch: SessionFetcher) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            # Background refreshes are never awaited; mark their errors as seen.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: Optional[str], fetch: SessionFetcher) -> SessionBootstrap:
+        try:
+            entry = await fetch()
+        except Exception as e:
+            self.errors += 1
+            print(f"DEBUG: Session bootstrap failed for {key or 'direct'}: {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.refreshes += 1
+        self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Optional[str]):
+        """Drop the session for key, e.g. after a 403 or login redirect."""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+session_cache = SessionCache(settings.session_cache_ttl, settings.session_refresh_margin)
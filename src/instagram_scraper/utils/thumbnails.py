@@ -0,0 +1,72 @@
+"""Thumbnail rendering in a process pool (Pillow), video frames via ffmpeg."""
+
+import asyncio
+import io
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from ..config.settings import settings
+
+THUMBNAIL_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def render_thumbnail(data: bytes, size: int, fmt: str) -> bytes:
+    """Fit the image into size x size, honouring EXIF rotation. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "webp":
+            image.save(out, "WEBP", quality=80, method=4)
+        else:
+            image.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def extract_first_frame(url: str, timeout: float) -> bytes:
+    """First video frame as PNG; ffmpeg only reads the start of the file."""
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", url,
+         "-frames:v", "1", "-f", "image2pipe", "-vcodec", "png", "pipe:1"],
+        capture_output=True,
+        timeout=timeout,
+        check=True
+    )
+    return result.stdout
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.thumbnail_workers)
+    return _executor
+
+
+async def run_in_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool(), fn, *args)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,99 @@
+"""Choosing which encoding of each video item a client gets."""
+
+from dataclasses import dataclass
+from typing import List, Optional
+from ..config.settings import settings
+from ..models.media import MediaModel, MediaVariant
+
+MAX_RESOLUTION = "max_resolution"
+MAX_BITRATE = "max_bitrate"
+UNDER_SIZE = "under_size"
+ALL = "all"
+POLICIES = (MAX_RESOLUTION, MAX_BITRATE, UNDER_SIZE, ALL)
+
+
+@dataclass(frozen=True)
+class VariantPolicy:
+    name: str = MAX_RESOLUTION
+    max_mb: Optional[float] = None
+
+    @property
+    def tag(self) -> str:
+        """Short label used to key downloads made under this policy."""
+        if self.name == UNDER_SIZE:
+            return f"{UNDER_SIZE}-{self.max_mb:g}mb"
+        return self.name
+
+
+def policy_from(name: Optional[str], max_mb: Optional[float] = None) -> VariantPolicy:
+    name = name or settings.variant_policy
+    if name not in POLICIES:
+        raise ValueError(f"variant must be one of {', '.join(POLICIES)}")
+    if name == UNDER_SIZE:
+        return VariantPolicy(name, max_mb or settings.variant_max_mb)
+    return VariantPolicy(name)
+
+
+def estimate_size(bitrate: Optional[float], duration: Optional[float]) -> Optional[int]:
+    if bitrate and duration:
+        return int(bitrate * 1000 / 8 * duration)
+    return None
+
+
+def _resolution(variant: MediaVariant) -> int:
+    return (variant.width or 0) * (variant.height or 0)
+
+
+def choose(variants: List[MediaVariant], policy: VariantPolicy) -> List[MediaVariant]:
+    """
+    Pick the variant(s) of one item. under_size takes the best variant
+    whose known size fits max_mb, else the smallest one; variants of
+    unknown size are ranked by resolution.
+    """
+    if not variants or policy.name == ALL:
+        return list(variants)
+    if policy.name == MAX_BITRATE:
+        return [max(variants, key=lambda v: (v.bitrate or 0, _resolution(v)))]
+    if policy.name == UNDER_SIZE:
+        limit = policy.max_mb * 1024 * 1024
+        fitting = [v for v in variants if v.size is not None and v.size <= limit]
+        if fitting:
+            return [max(fitting, key=lambda v: (v.size, _resolution(v)))]
+        return [min(variants, key=lambda v: (v.size if v.size is not None else float("inf"), _resolution(v)))]
+    return [max(variants, key=lambda v: (_resolution(v), v.bitrate or 0))]
+
+
+def apply_policy(media: MediaModel, policy: VariantPolicy) -> MediaModel:
+    """
+    Copy of media whose media_urls follow the policy. Items without
+    variants (images, single-format videos) are left as they are.
+    """
+    if not any(len(item) > 1 for item in media.variants):
+        return media
+    media_urls, thumbnail_urls, variants = [], [], []
+    for i, url in enumerate(media.media_urls):
+        item_variants = media.variants[i] if i < len(media.variants) else []
+        thumbnail = media.thumbnail_urls[i] if i < len(media.thumbnail_urls) else ""
+        chosen = choose(item_variants, policy) or [MediaVariant(url=url)]
+        for variant in chosen:
+            media_urls.append(variant.url)
+            thumbnail_urls.append(thumbnail)
+            variants.append(item_variants)
+    return media.model_copy(update={
+        "media_urls": media_urls,
+        "thumbnail_urls": thumbnail_urls if media.thumbnail_urls else [],
+        "variants": variants,
+    })
+
+
+def download_key(shortcode: str, policy: VariantPolicy, media: Optional[MediaModel] = None) -> str:
+    """
+    Download store / job key: the shortcode, suffixed with the policy when
+    it is not the default (and, if media is known, the post has alternative
+    encodings), so differently sized downloads do not overwrite each other.
+    """
+    if policy == policy_from(None):
+        return shortcode
+    if media is not None and not any(len(item) > 1 for item in media.variants):
+        return shortcode
+    return f"{shortcode}~{policy.tag}"
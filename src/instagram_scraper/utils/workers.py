@@ -0,0 +1,113 @@
+"""Bounded thread pool for blocking work such as yt-dlp calls."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from ..config.settings import settings
+
+
+class PoolFullError(RuntimeError):
+    """Raised when a WorkerPool already has its maximum of queued jobs."""
+
+
+class WorkerPool:
+    """
+    Runs blocking callables on a dedicated ThreadPoolExecutor so they never
+    block the event loop. At most max_workers jobs run at once and at most
+    max_queue more may wait; further submissions raise PoolFullError.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        on_finish: Optional[Callable[[], None]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool. If the caller is cancelled, a
+        job that has not started is dropped; a running one cannot be
+        interrupted, so it keeps its slot until its thread returns.
+        on_finish is called on the event loop exactly once, when the slot is
+        given back (or right away if the pool is full).
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            if on_finish is not None:
+                on_finish()
+            raise PoolFullError(f"{self.name} pool is full ({self._pending} jobs pending)")
+        self._pending += 1
+        self.submitted += 1
+        enqueued_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        def job():
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self._active += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self.completed += 1
+
+        def finished(_):
+            try:
+                loop.call_soon_threadsafe(self._finish, on_finish)
+            except RuntimeError:
+                # Loop already closed (shutdown); nothing left to account for.
+                pass
+
+        future = self._executor.submit(job)
+        # Registered before wrap_future's callback, so the slot is free by
+        # the time the caller resumes.
+        future.add_done_callback(finished)
+        return await asyncio.wrap_future(future)
+
+    def _finish(self, on_finish: Optional[Callable[[], None]]):
+        self._pending -= 1
+        if on_finish is not None:
+            on_finish()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            active = self._active
+            started = self.completed + active
+            avg_wait = self._wait_total / started if started else 0.0
+            max_wait = self._wait_max
+        return {
+            "workers": self.max_workers,
+            "active": active,
+            "queued": max(self._pending - active, 0),
+            "utilisation": round(active / self.max_workers, 4),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait_seconds": round(avg_wait, 4),
+            "max_queue_wait_seconds": round(max_wait, 4),
+        }
+
+
+download_pool = WorkerPool("download", settings.download_workers, settings.download_queue_limit)
@@ -0,0 +1,126 @@
+"""Streaming ZIP (stored) archives built from concurrently downloaded items."""
+
+import asyncio
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from ..config.settings import settings
+from .downloader import extension_for, ytdlp_download
+from .export import ChunkSink
+from .http_pool import client_pool
+from .workers import download_pool
+
+# A source opens one item and returns (file extension, byte chunks).
+Source = Callable[[], Awaitable[Tuple[str, AsyncIterator[bytes]]]]
+_END = object()
+
+
+def file_source(path: str) -> Source:
+    async def open_file():
+        async def chunks():
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(settings.download_chunk_size), b""):
+                    yield chunk
+        return os.path.splitext(path)[1].lstrip(".") or "file", chunks()
+    return open_file
+
+
+def cdn_source(url: str) -> Source:
+    async def open_cdn():
+        client = client_pool.get_client(None)
+        resp = await client.send(client.build_request("GET", url), stream=True)
+        if resp.is_error:
+            await resp.aclose()
+            resp.raise_for_status()
+
+        async def chunks():
+            try:
+                async for chunk in resp.aiter_bytes(settings.download_chunk_size):
+                    yield chunk
+            finally:
+                await resp.aclose()
+        return extension_for(resp.headers.get("content-type", ""), url), chunks()
+    return open_cdn
+
+
+def ytdlp_source(url: str, stem: str) -> Source:
+    """yt-dlp cannot stream to us, so the item goes through a temp file."""
+    async def open_ytdlp():
+        tmp_dir = tempfile.mkdtemp(prefix="zip-", dir=settings.downloads_staging_dir)
+        try:
+            path = await download_pool.run(ytdlp_download, url, tmp_dir, stem)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        ext, file_chunks = await file_source(path)()
+
+        async def chunks():
+            try:
+                async for chunk in file_chunks:
+                    yield chunk
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return ext, chunks()
+    return open_ytdlp
+
+
+async def zip_stream(
+    items: List[Tuple[str, Source]],
+    concurrency: int,
+    buffer_chunks: int,
+    download_slots: Optional[asyncio.Semaphore] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield a ZIP_STORED archive of items (stem, source) in order. Up to
+    `concurrency` items download at once, each into a queue of at most
+    buffer_chunks chunks, so memory stays bounded by
+    concurrency * buffer_chunks * download_chunk_size whatever the post
+    size. The first entry is sent as soon as its bytes arrive. When
+    download_slots is given, each item also holds one of its slots while
+    it downloads, sharing a global limit with other downloads.
+    Entries use data descriptors because sizes and CRCs are unknown up front.
+    """
+    queues = [asyncio.Queue(maxsize=buffer_chunks) for _ in items]
+    slots = asyncio.Semaphore(concurrency)
+
+    async def pump(source: Source, queue: asyncio.Queue):
+        async with slots, (download_slots or contextlib.nullcontext()):
+            try:
+                ext, chunks = await source()
+                await queue.put(ext)
+                try:
+                    async for chunk in chunks:
+                        await queue.put(chunk)
+                finally:
+                    await chunks.aclose()
+                await queue.put(_END)
+            except Exception as e:
+                await queue.put(e)
+
+    async def take(queue: asyncio.Queue):
+        value = await queue.get()
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    tasks = [asyncio.create_task(pump(source, queue)) for (_, source), queue in zip(items, queues)]
+    sink = ChunkSink()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for (stem, _), queue in zip(items, queues):
+                info = zipfile.ZipInfo(f"{stem}.{await take(queue)}", date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, "w") as entry:
+                    while (chunk := await take(queue)) is not _END:
+                        entry.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()
+        # Central directory.
+        yield sink.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
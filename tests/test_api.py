@@ -1,7 +1,33 @@
 """API tests."""
 
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from unittest.mock import AsyncMock, patch
+import httpx
+import pytest
+from PIL import Image
+from fastapi import HTTPException, Request
 from fastapi.testclient import TestClient
 from src.instagram_scraper.main import app
+from src.instagram_scraper.api import routes
+from src.instagram_scraper.config.settings import settings
+from src.instagram_scraper.models.media import MediaModel, MediaVariant
+from src.instagram_scraper.models.post import PostModel
+from src.instagram_scraper.models.profile import ProfileModel
+from src.instagram_scraper.scrapers.media import MediaScraper
+from src.instagram_scraper.scrapers.posts import PostsScraper
+from src.instagram_scraper.scrapers.profile import ProfileScraper
+from src.instagram_scraper.storage.downloads import DownloadStore
+from src.instagram_scraper.storage.posts import PostStore
+from src.instagram_scraper.storage.thumbnails import ThumbnailStore
+from src.instagram_scraper.storage.user_ids import UserIdCache
+from src.instagram_scraper.utils.cache import media_cache
+from src.instagram_scraper.utils.jobs import download_progress
 
 client = TestClient(app)
 
@@ -13,4 +39,267 @@ def test_profile_endpoint():
 def test_posts_endpoint():
     response = client.get("/api/v1/posts/nasa?max_posts=10")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
\ No newline at end of file
+    assert isinstance(response.json(), list)
+
+def test_media_batch_streams_ndjson():
+    scrapers = []
+
+    async def resolve(self, shortcode):
+        scrapers.append(self)
+        if shortcode == "BROKEN":
+            raise ValueError("Both methods failed")
+        return MediaModel(shortcode=shortcode, media_urls=[f"https://cdn/{shortcode}.jpg"])
+
+    media_cache.invalidate("BATCH1")
+    misses = media_cache.misses
+    with patch.object(MediaScraper, "_resolve", resolve):
+        response = client.post("/api/v1/media/batch", json={"items": [
+            "https://www.instagram.com/p/BATCH1/", "BROKEN", "https://www.instagram.com/stories/x/"
+        ]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = {r["input"]: r for r in map(json.loads, response.text.splitlines())}
+    assert records["https://www.instagram.com/p/BATCH1/"]["media"]["shortcode"] == "BATCH1"
+    assert records["BROKEN"]["ok"] is False
+    assert "Invalid IG URL" in records["https://www.instagram.com/stories/x/"]["error"]
+    assert len(scrapers) == 2 and scrapers[0] is not scrapers[1]
+    assert media_cache.misses == misses + 2
+
+def test_posts_stream_sse():
+    async def iter_posts(self, max_posts):
+        for code in ("S1", "S2"):
+            yield PostModel(shortcode=code, caption="", likes=0, comments=0, timestamp=0)
+
+    with patch("src.instagram_scraper.api.routes._user_id_for", AsyncMock(return_value="1")), \
+            patch.object(PostsScraper, "iter_posts", iter_posts):
+        response = client.get("/api/v1/posts/nasa?max_posts=2&stream=sse")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: post", "event: post", "event: end"]
+    assert '"shortcode": "S2"' in response.text
+
+def test_posts_export_streams_gzipped_csv():
+    async def iter_posts(self, max_posts):
+        for code in ("E1", "E2"):
+            yield PostModel(shortcode=code, caption="a, \"quoted\" caption", likes=3, comments=1, timestamp=0)
+
+    with patch("src.instagram_scraper.api.routes._user_id_for", AsyncMock(return_value="1")), \
+            patch.object(PostsScraper, "iter_posts", iter_posts):
+        response = client.get("/api/v1/posts/nasa/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-encoding"] == "gzip"
+    assert 'filename="nasa_posts.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["shortcode"] for row in rows] == ["E1", "E2"]
+    assert rows[0]["caption"] == "a, \"quoted\" caption"
+
+def test_store_endpoints(tmp_path):
+    assert client.get("/api/v1/store/posts").status_code == 404
+    store = PostStore(str(tmp_path / "posts.db"))
+    store.upsert_posts("nasa", [
+        PostModel(shortcode="LOW", likes=1, comments=0, timestamp=10),
+        PostModel(shortcode="HIGH", likes=50, comments=0, timestamp=20),
+        PostModel(shortcode="LATE", likes=500, comments=0, timestamp=99),
+    ])
+    with patch("src.instagram_scraper.api.routes.post_store", store):
+        response = client.get("/api/v1/store/posts?username=nasa&since=0&until=50&sort=likes")
+    assert response.status_code == 200
+    assert [post["shortcode"] for post in response.json()["posts"]] == ["HIGH", "LOW"]
+
+def test_posts_uses_cached_user_id(tmp_path):
+    cache = UserIdCache(str(tmp_path / "ids.db"), ttl=3600)
+    cache.set("cached_user", "42")
+    paged_ids = []
+
+    async def iter_posts(self, max_posts):
+        paged_ids.append(self.user_id)
+        yield PostModel(shortcode="C1", likes=0, comments=0, timestamp=0)
+
+    profile = ProfileModel(username="no_id", full_name="", biography="", followers=0, following=0,
+                           posts_count=0, is_private=False, profile_pic_url="")
+    profile_scrape = AsyncMock(return_value=profile)
+    with patch("src.instagram_scraper.api.routes.user_id_cache", cache), \
+            patch.object(ProfileScraper, "scrape", profile_scrape), \
+            patch.object(PostsScraper, "iter_posts", iter_posts):
+        hit = client.get("/api/v1/posts/cached_user?max_posts=1")
+        miss = client.get("/api/v1/posts/no_id?max_posts=1")
+    assert hit.status_code == 200 and paged_ids == ["42"]
+    assert profile_scrape.await_count == 1
+    assert miss.status_code == 502
+
+def test_posts_drops_cached_user_id_of_unknown_user(tmp_path):
+    cache = UserIdCache(str(tmp_path / "ids.db"), ttl=3600)
+    cache.set("renamed", "42")
+    gone = httpx.Response(200, json={"data": {"user": None}})
+    with patch("src.instagram_scraper.api.routes.user_id_cache", cache), \
+            patch.object(PostsScraper, "_make_request", AsyncMock(return_value=gone)):
+        response = client.get("/api/v1/posts/renamed?max_posts=1")
+    assert response.status_code == 404
+    assert cache.get("renamed") is None
+
+def test_download_async_job_and_events():
+    async def fake_download(shortcode, media, key=None):
+        progress = download_progress.acquire(key)
+        progress.set_items(1)
+        progress.progress(1, 5, 5, done=True)
+        download_progress.release(progress)
+        return {"shortcode": shortcode, "files": [], "cached": False}
+
+    media = MediaModel(shortcode="JOB1", media_urls=["https://cdn/x.jpg"])
+    with TestClient(app) as job_client, \
+            patch.object(MediaScraper, "scrape", AsyncMock(return_value=media)), \
+            patch("src.instagram_scraper.api.routes._download_post", fake_download):
+        response = job_client.get("/api/v1/download?shortcode=JOB1&async=true")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        for _ in range(50):
+            status = job_client.get(f"/api/v1/jobs/{job_id}").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.02)
+        assert status["result"]["shortcode"] == "JOB1"
+        assert status["shortcode"] == "JOB1" and status["policy"] == "max_resolution"
+        assert status["files"] == [{"index": 1, "downloaded": 5, "total": 5, "done": True}]
+        events = job_client.get(f"/api/v1/jobs/{job_id}/events").text
+        assert events.startswith("event: done")
+        assert job_client.get("/api/v1/jobs/missing").status_code == 404
+
+def test_stream_passes_range_through_and_tees(tmp_path):
+    payload = b"0123456789" * 1000
+
+    def cdn(request):
+        if "range" in request.headers:
+            start, end = map(int, request.headers["range"][6:].split("-"))
+            return httpx.Response(206, content=payload[start:end + 1], headers={
+                "content-type": "video/mp4", "content-range": f"bytes {start}-{end}/{len(payload)}"})
+        return httpx.Response(200, content=payload, headers={"content-type": "video/mp4"})
+
+    store = DownloadStore(str(tmp_path / "downloads"), str(tmp_path / "staging"),
+                          str(tmp_path / "index.db"), str(tmp_path / "blobs"))
+    cdn_client = httpx.AsyncClient(transport=httpx.MockTransport(cdn))
+    media = MediaModel(shortcode="REEL1", media_urls=["https://scontent.cdninstagram.com/v.mp4"], is_video=True)
+    with patch.object(MediaScraper, "scrape", AsyncMock(return_value=media)), \
+            patch("src.instagram_scraper.api.routes.client_pool.get_client", return_value=cdn_client), \
+            patch("src.instagram_scraper.api.routes.download_store", store), \
+            patch.object(settings, "stream_tee", True):
+        partial = client.get("/api/v1/stream/REEL1", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.content == payload[10:20]
+        assert partial.headers["content-range"] == f"bytes 10-19/{len(payload)}"
+        assert store.lookup("REEL1", 1) is None
+
+        full = client.get("/api/v1/stream/REEL1")
+        assert full.status_code == 200 and full.content == payload
+        assert store.lookup("REEL1", 1)[0]["name"] == "REEL1_001.mp4"
+        assert not os.listdir(tmp_path / "staging")
+
+        cached = client.get("/api/v1/stream/REEL1", headers={"Range": "bytes=0-4"})
+        assert cached.status_code == 206 and cached.content == payload[:5]
+
+        # A client that leaves before the body starts leaves no staging dir behind.
+        store.remove("REEL1")
+        response = asyncio.run(routes.stream_media(Request({"type": "http", "headers": []}), "REEL1", 1, None, None))
+        asyncio.run(response.background())
+        assert not os.listdir(tmp_path / "staging")
+    assert routes.global_download_slots._value == settings.download_global_concurrency
+
+def test_download_zip_streams_carousel():
+    def cdn(request):
+        name = request.url.path.strip("/")
+        return httpx.Response(200, content=name.encode() * 100,
+                              headers={"content-type": "video/mp4" if name == "b" else "image/jpeg"})
+
+    media = MediaModel(shortcode="CAROUSEL1", media_urls=[
+        "https://scontent.cdninstagram.com/a", "https://scontent.cdninstagram.com/b"])
+    cdn_client = httpx.AsyncClient(transport=httpx.MockTransport(cdn))
+    with patch.object(MediaScraper, "scrape", AsyncMock(return_value=media)), \
+            patch("src.instagram_scraper.utils.zipstream.client_pool.get_client", return_value=cdn_client):
+        response = client.get("/api/v1/download/CAROUSEL1.zip")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.namelist() == ["CAROUSEL1_001.jpg", "CAROUSEL1_002.mp4"]
+    assert archive.read("CAROUSEL1_002.mp4") == b"b" * 100
+
+def test_thumbnail_is_rendered_once_and_cached(tmp_path):
+    source = io.BytesIO()
+    Image.new("RGB", (1080, 720), "red").save(source, "JPEG")
+    fetched = []
+
+    def cdn(request):
+        fetched.append(request.url.path)
+        return httpx.Response(200, content=source.getvalue(), headers={"content-type": "image/jpeg"})
+
+    media = MediaModel(shortcode="THUMB1", media_urls=[
+        "https://scontent.cdninstagram.com/full1.jpg", "https://scontent.cdninstagram.com/clip.mp4"
+    ], thumbnail_urls=["https://scontent.cdninstagram.com/a.jpg", "https://scontent.cdninstagram.com/cover.jpg"])
+    store = ThumbnailStore(str(tmp_path / "thumbs"), str(tmp_path / "thumbs.db"))
+    with patch.object(MediaScraper, "scrape", AsyncMock(return_value=media)), \
+            patch("src.instagram_scraper.api.routes.client_pool.get_client",
+                  return_value=httpx.AsyncClient(transport=httpx.MockTransport(cdn))), \
+            patch("src.instagram_scraper.api.routes.thumbnail_store", store):
+        first = client.get("/api/v1/thumbnails/THUMB1/2?size=100")
+        again = client.get("/api/v1/thumbnails/THUMB1/2?size=100")
+        revalidated = client.get("/api/v1/thumbnails/THUMB1/2?size=100",
+                                 headers={"If-None-Match": first.headers["etag"]})
+        preview = client.get("/api/v1/preview/THUMB1").json()
+    assert first.status_code == 200 and first.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(first.content)).size == (100, 67)
+    assert "max-age" in first.headers["cache-control"]
+    assert again.content == first.content and fetched == ["/cover.jpg"]
+    assert revalidated.status_code == 304
+    assert [item["url"] for item in preview["thumbnails"]] == [
+        "/api/v1/thumbnails/THUMB1/1", "/api/v1/thumbnails/THUMB1/2"]
+
+def test_media_variant_query_selects_encoding():
+    mb = 1024 * 1024
+    media = MediaModel(shortcode="VARIANTS1", media_urls=["https://cdn/hd.mp4"], is_video=True, variants=[[
+        MediaVariant(url="https://cdn/hd.mp4", width=1080, height=1920, size=20 * mb),
+        MediaVariant(url="https://cdn/sd.mp4", width=540, height=960, size=5 * mb),
+    ]])
+
+    async def resolve(self, shortcode):
+        return media
+
+    with patch.object(MediaScraper, "_resolve", resolve):
+        assert client.get("/api/v1/media/VARIANTS1").json()["media_urls"] == ["https://cdn/hd.mp4"]
+        small = client.get("/api/v1/media/VARIANTS1?variant=under_size&max_mb=10").json()
+        assert small["media_urls"] == ["https://cdn/sd.mp4"]
+        everything = client.get("/api/v1/media/VARIANTS1?variant=all").json()
+        assert everything["media_urls"] == ["https://cdn/hd.mp4", "https://cdn/sd.mp4"]
+        assert client.get("/api/v1/media/VARIANTS1?variant=smallest").status_code == 422
+
+async def test_download_post_cancels_other_items_on_failure(tmp_path):
+    store = DownloadStore(str(tmp_path / "downloads"), str(tmp_path / "staging"),
+                          str(tmp_path / "index.db"), str(tmp_path / "blobs"))
+    cancelled = asyncio.Event()
+    staging_dirs = []
+
+    async def download_item(index, url, shortcode, output_dir, post_slots, job=None):
+        staging_dirs.append(output_dir)
+        if index == 1:
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=500, detail="Download failed for URL 1")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            assert os.path.isdir(output_dir)
+            cancelled.set()
+            raise
+
+    media = MediaModel(shortcode="FAIL1", media_urls=["https://cdn/a.jpg", "https://cdn/b.mp4"])
+    with patch.object(routes, "_download_item", download_item), patch.object(routes, "download_store", store):
+        with pytest.raises(HTTPException):
+            await routes._download_post("FAIL1", media)
+    assert cancelled.is_set()
+    assert not os.path.exists(staging_dirs[0])
+
+def test_admin_proxies_requires_token():
+    assert client.get("/api/v1/admin/proxies").status_code == 404
+    with patch.object(settings, "admin_token", "s3cret"):
+        assert client.get("/api/v1/admin/proxies").status_code == 401
+        assert client.get("/api/v1/admin/proxies", headers={"X-Admin-Token": "wrong"}).status_code == 401
+        response = client.get("/api/v1/admin/proxies", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200 and "proxies" in response.json()
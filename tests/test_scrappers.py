@@ -25,10 +25,155 @@ async def test_profile_scrape(mock_response):
             assert profile.username == "nasa"
             assert profile.followers > 0
 
+def _feed_page(shortcodes, end_cursor=None, timestamps=None, pinned=()):
+    timestamps = timestamps or [1700000000] * len(shortcodes)
+    edges = [{"node": {
+        "shortcode": code,
+        "edge_media_preview_like": {"count": 1},
+        "edge_media_to_comment": {"count": 0},
+        "taken_at_timestamp": timestamp,
+        "pinned_for_users": [{"id": "1"}] if code in pinned else [],
+    }} for code, timestamp in zip(shortcodes, timestamps)]
+    return Response(200, json={"data": {"user": {"edge_owner_to_timeline_media": {
+        "edges": edges,
+        "page_info": {"has_next_page": end_cursor is not None, "end_cursor": end_cursor},
+    }}}})
+
 @pytest.mark.asyncio
 async def test_posts_scrape():
-    pass 
+    pages = [_feed_page(["A1", "A2"], "c1"), _feed_page(["B1", "B2"])]
+    with patch.object(PostsScraper, "_make_request", AsyncMock(side_effect=pages)), \
+            patch("src.instagram_scraper.scrapers.posts.asyncio.sleep", AsyncMock()):
+        async with PostsScraper("1") as scraper:
+            posts = await scraper.scrape(3)
+    assert [post.shortcode for post in posts] == ["A1", "A2", "B1"]
+
+@pytest.mark.asyncio
+async def test_posts_iter_stops_paging_when_closed():
+    request = AsyncMock(side_effect=[_feed_page(["A1", "A2"], "c1"), _feed_page(["B1"])])
+    with patch.object(PostsScraper, "_make_request", request), \
+            patch("src.instagram_scraper.scrapers.posts.asyncio.sleep", AsyncMock()):
+        async with PostsScraper("1") as scraper:
+            posts = scraper.iter_posts(10)
+            first = await posts.__anext__()
+            await posts.aclose()
+    assert first.shortcode == "A1"
+    assert request.await_count == 1
+
+async def _sync(state, pages, max_pages=1, backfill=False):
+    request = AsyncMock(side_effect=pages)
+    with patch.object(PostsScraper, "_make_request", request), \
+            patch("src.instagram_scraper.scrapers.posts.asyncio.sleep", AsyncMock()):
+        async with PostsScraper("1") as scraper:
+            posts = await scraper.sync(state, max_pages, backfill)
+    return [post.shortcode for post in posts], request.await_count
+
+@pytest.mark.asyncio
+async def test_posts_sync_stops_at_high_water_mark_and_closes_gaps():
+    from src.instagram_scraper.storage.sync_state import SyncState
+    state = SyncState(username="nasa")
+
+    assert await _sync(state, [_feed_page(["A", "B"], "c1", [300, 200])]) == (["A", "B"], 1)
+    assert state.newest_mark == (300, "A") and state.backfill_cursor == "c1"
+
+    # Only the new post is returned; the old pinned post does not end the scan.
+    page = _feed_page(["OLD", "N", "A", "B"], "x", [100, 400, 300, 200], pinned={"OLD"})
+    assert await _sync(state, [page]) == (["N"], 1)
+    assert state.newest_mark == (400, "N")
+
+    # More new posts than the page budget: a gap down to N is remembered.
+    assert await _sync(state, [_feed_page(["X", "Y"], "c2", [600, 500])]) == (["X", "Y"], 1)
+    assert state.gap_cursor == "c2" and state.gap_mark == (400, "N")
+
+    # The next poll spends its spare page closing that gap.
+    pages = [_feed_page(["Z", "X"], "x", [700, 600]), _feed_page(["W", "N"], "c3", [450, 400])]
+    assert await _sync(state, pages, max_pages=2) == (["Z", "W"], 2)
+    assert state.gap_cursor is None and state.newest_mark == (700, "Z")
+
+    assert await _sync(state, [_feed_page(["C"], None, [100])], backfill=True) == (["C"], 1)
+    assert state.backfill_complete and state.backfill_cursor is None
 
 @pytest.mark.asyncio
 async def test_media_scrape():
-    pass
\ No newline at end of file
+    pass
+
+@pytest.mark.asyncio
+async def test_media_scrape_skips_graphql_while_circuit_open():
+    from src.instagram_scraper.utils.circuit import media_breakers
+    from src.instagram_scraper.models.media import MediaModel
+
+    media = MediaModel(shortcode="CIRCUIT", media_urls=["https://cdn/a.jpg"])
+    with patch.object(MediaScraper, "_scrape_with_graphql", new_callable=AsyncMock) as graphql, \
+            patch.object(MediaScraper, "_scrape_with_ytdlp", new_callable=AsyncMock) as ytdlp:
+        graphql.side_effect = ValueError("302 Redirect to login")
+        ytdlp.return_value = media
+        breaker = media_breakers.get("graphql", None)
+        async with MediaScraper() as scraper:
+            for _ in range(breaker.failure_threshold + 2):
+                assert await scraper._resolve("CIRCUIT") == media
+        assert graphql.await_count == breaker.failure_threshold
+        assert breaker.state == "open"
+        breaker.record_success()
+
+        # Errors about the post itself are not evidence of a block.
+        graphql.reset_mock()
+        graphql.side_effect = ValueError("Post CIRCUIT not found (deleted or private)")
+        async with MediaScraper() as scraper:
+            for _ in range(breaker.failure_threshold + 2):
+                assert await scraper._resolve("CIRCUIT") == media
+        assert graphql.await_count == breaker.failure_threshold + 2
+        assert breaker.state == "closed" and breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_media_hedging_races_ytdlp_against_slow_graphql():
+    import asyncio
+    from src.instagram_scraper.config.settings import settings
+    from src.instagram_scraper.models.media import MediaModel
+
+    fast = MediaModel(shortcode="HEDGE", media_urls=["https://cdn/ytdlp.jpg"])
+    graphql_cancelled = asyncio.Event()
+
+    async def slow_graphql(shortcode):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            graphql_cancelled.set()
+            raise
+
+    with patch.object(MediaScraper, "_scrape_with_graphql", side_effect=slow_graphql), \
+            patch.object(MediaScraper, "_scrape_with_ytdlp", new_callable=AsyncMock) as ytdlp, \
+            patch.object(settings, "media_hedging", True), \
+            patch.object(settings, "hedge_default_delay", 0.05), \
+            patch.object(settings, "hedge_min_delay", 0.01):
+        ytdlp.return_value = fast
+        async with MediaScraper() as scraper:
+            assert await asyncio.wait_for(scraper._resolve("HEDGE"), timeout=1) == fast
+        await asyncio.wait_for(graphql_cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_media_graphql_video_versions_are_variants_of_one_item():
+    from types import SimpleNamespace
+    from src.instagram_scraper.utils.variants import VariantPolicy, apply_policy
+
+    node = {
+        "display_url": "https://cdn/cover.jpg",
+        "video_versions": [
+            {"url": "https://cdn/480.mp4", "width": 480, "height": 854},
+            {"url": "https://cdn/1080.mp4", "width": 1080, "height": 1920},
+            {"url": "https://cdn/720.mp4", "width": 720, "height": 1280},
+        ],
+    }
+    session = SimpleNamespace(csrf_token="token", cookies={})
+    with patch("src.instagram_scraper.scrapers.media.session_cache.get", AsyncMock(return_value=session)), \
+            patch.object(MediaScraper, "_make_request", AsyncMock(
+                return_value=Response(200, json={"data": {"xdt_shortcode_media": node}}))):
+        async with MediaScraper() as scraper:
+            media = await scraper._scrape_with_graphql("VERSIONS")
+
+    assert media.media_urls == ["https://cdn/1080.mp4"]
+    assert [v.width for v in media.variants[0]] == [480, 1080, 720]
+    assert apply_policy(media, VariantPolicy("all")).media_urls == [
+        "https://cdn/480.mp4", "https://cdn/1080.mp4", "https://cdn/720.mp4"
+    ]
@@ -87,19 +87,8 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        const controller = new AbortController();
-        const timeoutId = setTimeout(() => controller.abort(), 500000);
-
         try {
-            console.log('Downloading at /api/v1/download?shortcode=' + shortcode + '...');
-            const downloadResponse = await fetch(`/api/v1/download?shortcode=${shortcode}`, { signal: controller.signal });
-            clearTimeout(timeoutId);
-
-            if (!downloadResponse.ok) {
-                const errorText = await downloadResponse.text();
-                throw new Error(`Download failed: ${downloadResponse.status} - ${errorText.substring(0, 100)}`);
-            }
-            const data = await downloadResponse.json();
+            const data = await runDownloadJob(shortcode);
             console.log('Download data:', data);
 
             if (data.cached) {
@@ -220,6 +209,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     grid.appendChild(extraDiv);
                 });
                 previewDiv.appendChild(grid);
+
+                const zipBtn = document.createElement('button');
+                zipBtn.textContent = `Download all ${data.files.length} files (.zip)`;
+                zipBtn.onclick = () => downloadFile(`/api/v1/download/${shortcode}.zip`, `${shortcode}.zip`);
+                previewDiv.appendChild(zipBtn);
             }
 
             showNewDownloadButton();
@@ -227,16 +221,71 @@ document.addEventListener('DOMContentLoaded', function() {
             console.log('Downloads complete—preview rendered from local files.');
 
         } catch (error) {
-            clearTimeout(timeoutId);
             console.error('Submit error:', error);
             status.className = 'status error';
             status.style.display = 'block';
-            status.textContent = `Error: ${error.name === 'AbortError' ? 'Timeout (30s)' : error.message}`;
+            status.textContent = `Error: ${error.message}`;
             form.classList.remove('hidden');
             showNewDownloadButton();
         }
     });
 
+    async function runDownloadJob(shortcode) {
+        console.log('Queueing download job for ' + shortcode + '...');
+        const response = await fetch(`/api/v1/download?shortcode=${shortcode}&async=true`);
+        if (!response.ok) {
+            const errorText = await response.text();
+            throw new Error(`Download failed: ${response.status} - ${errorText.substring(0, 100)}`);
+        }
+        const job = await response.json();
+        console.log('Download job:', job);
+
+        return new Promise((resolve, reject) => {
+            // EventSource reconnects by itself; each connection starts with the current status.
+            const source = new EventSource(job.events_url);
+            source.addEventListener('progress', (event) => showProgress(JSON.parse(event.data)));
+            source.addEventListener('done', (event) => {
+                source.close();
+                resolve(JSON.parse(event.data).result);
+            });
+            source.addEventListener('failed', (event) => {
+                source.close();
+                reject(new Error(JSON.parse(event.data).error || 'Download failed'));
+            });
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('Lost connection to the download job'));
+                }
+            };
+        });
+    }
+
+    function showProgress(job) {
+        if (job.status === 'queued') {
+            status.textContent = 'Waiting in queue...';
+            return;
+        }
+        if (!job.files.length) {
+            status.textContent = 'Fetching media info...';
+            return;
+        }
+        const done = job.files.filter((file) => file.done).length;
+        let text = `Downloading ${done}/${job.files.length} files`;
+        if (job.total) {
+            text += ` - ${Math.floor(job.downloaded * 100 / job.total)}% (${formatBytes(job.downloaded)} of ${formatBytes(job.total)})`;
+        } else if (job.downloaded) {
+            text += ` - ${formatBytes(job.downloaded)}`;
+        }
+        status.textContent = text;
+    }
+
+    function formatBytes(bytes) {
+        if (bytes < 1024 * 1024) {
+            return `${(bytes / 1024).toFixed(0)} KB`;
+        }
+        return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    }
+
     function extractShortcode(url) {
         const parsed = new URL(url);
         let path = parsed.pathname;